@@ -1,114 +1,414 @@
-import re
-from io import BytesIO
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
-from django.utils.http import urlsafe_base64_encode
-from seaborn import FacetGrid
+from django.conf import settings
+from django.db import transaction
 
-from .local_vars import image_dir_prefix
+from . import charts
+from .gamelog import (
+    Tokenizer, iter_escaped_lines, iter_text_lines, EVENT_KINDS, HIT, NEUT, WARP, BOUNTY, HIT_PATTERN, TIME_FORMAT,
+)
 from .models import Plot
+from .render_server import render
+from .stages import stage, instrumented, record
+from .storage import store_reference
+
+# number of processes rendering the charts of an analysis in parallel, 0 renders them one by one in place
+RENDER_WORKERS = getattr(settings, 'ANALYZER_RENDER_WORKERS', 0)
+# zlib level of the chart pngs, 1 encoding fastest at the cost of larger files, None keeping the matplotlib default
+PNG_COMPRESS_LEVEL = getattr(settings, 'ANALYZER_PNG_COMPRESS_LEVEL', None)
+
+# 'db' keeping the chart pngs in the Plot row, 'files' keeping them in the chart storage, where they expire,
+# with only their references in the row (see storage.load_blob)
+PLOT_STORAGE = getattr(settings, 'ANALYZER_PLOT_STORAGE', 'db')
+
+# Plot model fields receiving the rendered charts
+PLOT_FIELDS = {
+    'delivered_overall_bars': 'weapon_performance_per_hit',
+    'delivered_totals_pies': 'weapon_performance_totals',
+    'mean_delivered': 'mean_delivered',
+    'top_delivered': 'top_delivered',
+    'received_overall_bars': 'incoming_per_hit',
+    'received_totals_pies': 'incoming_totals',
+    'mean_received': 'mean_received',
+    'top_received': 'top_received',
+    'total_received': 'total_received',
+    'delivered_timeline': 'dps_delivered',
+    'received_timeline': 'dps_received',
+    'neut_timeline': 'neut_pressure',
+}
+
+# damage stats computed per weapon and entity in a single groupby pass per direction
+DAMAGE_STATS = ['mean', 'max', 'sum', 'count']
+
+# hit events turned into a typed dataframe at a time while parsing, for the raw hit lines never to pile up
+HIT_BATCH = getattr(settings, 'ANALYZER_HIT_BATCH', 50000)
+
+# hit body words as split by hit_rows
+HIT_DIRECTIONS = frozenset({'to', 'from'})
+HIT_QUALITIES = frozenset({'Grazes', 'Hits', 'Glances Off', 'Smashes', 'Penetrates', 'Wrecks'})
+
+# column types of the hits dataframe
+HIT_DTYPES = {
+    'Damage': 'int32', 'Direction': 'category', 'Entity': 'category', 'Weapon': 'category', 'Token': 'category'
+}
+
+# seconds of the rolling window the damage and neut rates over time are averaged over
+TIMELINE_WINDOW = getattr(settings, 'ANALYZER_TIMELINE_WINDOW', 10)
+# points per line at most of the charts over time, longer timelines being averaged into wider bins
+TIMELINE_POINTS = getattr(settings, 'ANALYZER_TIMELINE_POINTS', 600)
+
+# bars, wedges and lines per chart at most, the weapons or entities of least damage beyond being lumped into OTHER,
+# for the charts of logs with hundreds of enemies to stay readable and quick to render
+CHART_TOP = getattr(settings, 'ANALYZER_CHART_TOP', 12)
+GRID_TOP = getattr(settings, 'ANALYZER_GRID_TOP', {'Weapon': 12, 'Entity': 25})  # rows and columns of the damage grids
+OTHER = 'Other'
+
+# seconds without hits ending an engagement, and the shorter pause ending one when the next hit is on another entity
+ENGAGEMENT_GAP = getattr(settings, 'ANALYZER_ENGAGEMENT_GAP', 120)
+ENGAGEMENT_SWITCH_GAP = getattr(settings, 'ANALYZER_ENGAGEMENT_SWITCH_GAP', 30)
+
+_render_pool = None
+
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _render_pool
+
+
+def render_charts(specs):
+    """
+    :specs: dict of chart name: (chart function, keyword arguments)
+    :return: dict of chart name: png bytes, rendered in the process pool when enabled,
+    or else by the render server when configured
+    """
+    if not RENDER_WORKERS or len(specs) < 2:
+        return {name: render(chart, kwargs) for name, (chart, kwargs) in specs.items()}
+    pool = get_render_pool()
+    futures = {name: pool.submit(chart, **kwargs) for name, (chart, kwargs) in specs.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def hit_rows(hits):
+    """
+    :hits: (time, body) hit events as collected by the tokenizer
+    :return: list of (time, damage, direction, entity, weapon, token) rows, split on the ' - ' separators,
+    'Unknown' standing for missing enemy weapon data, and only the bodies that don't split cleanly,
+    such as entity names with separators of their own, matched with HIT_PATTERN
+    """
+    rows = []
+    for time, body in hits:
+        words = body.split(' ', 2)
+        parts = words[-1].split(' - ')
+        if (len(words) == 3 and words[0].isdigit() and words[1] in HIT_DIRECTIONS and 1 < len(parts) < 4
+                and parts[-1] in HIT_QUALITIES):
+            weapon = parts[1] if len(parts) == 3 else 'Unknown'
+            rows.append((time, words[0], words[1], parts[0], weapon, parts[-1]))
+            continue
+        hit = HIT_PATTERN.match(body)
+        if hit is not None:
+            weapon = hit['Weapon'] or 'Unknown'
+            rows.append((time, hit['Damage'], hit['Direction'], hit['Entity'], weapon, hit['Token']))
+    return rows
+
+
+def hits_frame(hits):
+    """
+    :hits: (time, body) hit events as collected by the tokenizer
+    :return: dataframe of hits with typed columns
+    """
+    hits_df = pd.DataFrame(data=hit_rows(hits), columns=['Time', 'Damage', 'Direction', 'Entity', 'Weapon', 'Token'])
+    hits_df['Time'] = pd.to_datetime(hits_df.Time, format=TIME_FORMAT, errors='coerce')
+    return hits_df.astype(HIT_DTYPES)
+
+
+def concat_hits(frames):
+    """:return: the hits dataframes made into one, categories being merged as well"""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return hits_frame([])
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True).astype(HIT_DTYPES)
+
+
+def drop_unused_categories(df):
+    """keeping the categories of a filtered dataframe limited to the values still present"""
+    df = df.copy()
+    for column in df.select_dtypes('category'):
+        df[column] = df[column].cat.remove_unused_categories()
+    return df
 
-matplotlib.use("Agg")
 
-sns.set_style("whitegrid")  # setting the visualization style
-sns.set_context("notebook", font_scale=.9)  # setting the visualization scale
+def aggregate_damage(hits):
+    """:return: dataframe of the damage stats per weapon and entity, the only groupby over the hits themselves"""
+    return hits.groupby(['Weapon', 'Entity'], observed=True).Damage.agg(DAMAGE_STATS)
 
 
-# function to produce a list of explode values for pie charts
-def pie_exploder(vals):
+def roll_up(stats, level):
+    """
+    :stats: dataframe of damage max, sum and count, indexed by weapon and entity among other levels
+    :return: the stats per value of the index level, rolled up from the finer stats rather than from the hits
+    """
+    rolled = stats.groupby(level=level, observed=True).agg({'max': 'max', 'sum': 'sum', 'count': 'sum'})
+    rolled.insert(0, 'mean', rolled['sum'] / rolled['count'])
+    return rolled
+
+
+def lump_tail(stats, top):
+    """
+    :stats: dataframe of damage max, sum and count, indexed by weapon, entity or both
+    :top: dict of index level: number of values kept at most, OTHER included
+    :return: the stats with the values of least total damage of every level over its top lumped into OTHER,
+    rolled up again and put last, unchanged if no level is over its top
+    """
+    over = {level: count for level, count in top.items() if stats.index.get_level_values(level).nunique() > count}
+    if not over:
+        return stats
+    levels = list(stats.index.names)
+    frame = stats.reset_index()
+    for level, count in over.items():
+        kept = frame.groupby(level, observed=True)['sum'].sum().nlargest(count - 1).index
+        frame[level] = frame[level].astype(str).where(frame[level].isin(kept), OTHER)
+    rolled = roll_up(frame.set_index(levels), levels if len(levels) > 1 else levels[0])
+    lumped = np.zeros(len(rolled), dtype=bool)
+    for level in over:
+        lumped |= rolled.index.get_level_values(level) == OTHER
+    return pd.concat([rolled[~lumped], rolled[lumped]])
+
+
+def covered_seconds(occupied, window):
+    """
+    :occupied: sorted unique seconds
+    :return: sorted seconds within the window after any of them, as the union of the intervals [o, o + window]
+    made in a single pass: the intervals being sorted by their ends too, a run of them ends where the next one starts
+    beyond its end
+    """
+    breaks = np.flatnonzero(np.diff(occupied) > window) + 1
+    firsts = occupied[np.r_[0, breaks]]
+    lengths = occupied[np.r_[breaks - 1, len(occupied) - 1]] + window + 1 - firsts
+    # each run counting up from its first second, the running count being rebased where a run starts
+    return np.arange(lengths.sum()) + np.repeat(firsts - (np.cumsum(lengths) - lengths), lengths)
+
+
+def rate_timeline(events, value, by, window=TIMELINE_WINDOW, top=CHART_TOP):
+    """
+    :events: dataframe of timed events, with a datetime64 'Time' column
+    :value: column of the amounts, such as 'Damage'
+    :by: column the lines are split by, such as 'Weapon', the lines of least total beyond the top ones
+    being summed up into OTHER
+    :return: dataframe of the amount per second of every line over the rolling window, with rows only for the seconds
+    within the window of an event, the rate being zero at all the others: the amounts are binned by line and
+    occupied second in a single bincount and the window sums taken as differences of their cumulative sums,
+    the log times being whole seconds, so that memory grows with the events rather than the time they span
+    """
+    events = events.dropna(subset=['Time'])
+    if events.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='Time'))
+    codes, names = pd.factorize(events[by], sort=True)
+    names = names.astype(str)
+    amounts = events[value].to_numpy(dtype=float)
+    if len(names) > top:
+        totals = np.bincount(codes, weights=amounts, minlength=len(names))
+        kept = np.zeros(len(names), dtype=bool)
+        kept[np.argsort(-totals, kind='stable')[:top - 1]] = True
+        codes = np.where(kept, np.cumsum(kept) - 1, top - 1)[codes]
+        names = names[kept].append(pd.Index([OTHER]))
+    start = events.Time.min()
+    seconds = ((events.Time - start) // pd.Timedelta(seconds=1)).to_numpy()
+    occupied, at = np.unique(seconds, return_inverse=True)
+    # cumulative sums per line, column k summing the amounts of the first k occupied seconds
+    sums = np.bincount(
+        codes * (len(occupied) + 1) + at + 1, weights=amounts, minlength=len(names) * (len(occupied) + 1)
+    ).reshape(len(names), len(occupied) + 1).cumsum(axis=1)
+    rows = covered_seconds(occupied, window)  # down to zero again window seconds after
+    rates = sums[:, np.searchsorted(occupied, rows, 'right')]
+    rates -= sums[:, np.searchsorted(occupied, rows - window, 'right')]
+    return pd.DataFrame(  # transposed back to the line-major layout the dataframe keeps its float block in
+        (rates / window).T, index=pd.DatetimeIndex(start + pd.to_timedelta(rows, unit='s'), name='Time'), columns=names
+    )
+
+
+def thin_timeline(timeline, points=TIMELINE_POINTS):
     """
-    :vals: a list of values to be represented by the pie vedges, sorted in descending order for best results
-    :return: a list of explode values for pie charts to only explode very narrow vedges
-    :required: numpy
+    :return: the timeline over every second of its span, the seconds it has no rows for being zero,
+    averaged into bins of whole seconds for no more than the given number of rows
     """
-    e = 0.01  # default explode value for all vedges
-    explode = np.zeros(len(vals)) + e  # generating default list of uniform explode values with numpy
-    i = 0
-    for val in vals:
-        if val / sum(vals) < 0.03:  # tiny vedge qualification threshold (fraction of the total sum)
-            explode[i] = e  # in the first run, default explode value is applied unchanged
-            e += .09  # incrementing the explode value starting from the second encountered tiny vedge
-        i += 1
-    return explode
-
-
-def plt_savefig(name):
-    save_path = f"main/static/main/images/chart_{name}.png"
-    plt.savefig(image_dir_prefix + save_path)
-
-
-def plot_damage_grid(data, palette, title, name):
-    x: FacetGrid = sns.relplot(y="Weapon", x="Entity", hue="Damage", size='Damage',
-                               data=data,
-                               height=4, aspect=3, linewidth=1, edgecolor='gray',
-                               palette=palette, sizes=(50, 250)
-                               )
-    x.ax.tick_params(axis='x', rotation=90)
-    plt.title(title)
-    save_path = f"main/static/main/images/chart_{name}.png"
-    x.savefig(image_dir_prefix + save_path)
-    buf = BytesIO()
-    x.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    return buf.getvalue()
+    if timeline.empty:
+        return timeline
+    span = (timeline.index[-1] - timeline.index[0]) // pd.Timedelta(seconds=1) + 1
+    if span <= points:
+        return timeline.asfreq('s', fill_value=0.0)
+    width = math.ceil(span / points)
+    return timeline.resample(f'{width}s', origin='start').sum() / width
+
+
+def peak_rates(timeline):
+    """:return: dict of line: highest rate, 'Total' being the highest rate of all the lines together"""
+    if timeline.empty:
+        return {}
+    rates = timeline.to_numpy()
+    peaks = dict(zip(timeline.columns, rates.max(axis=0)), Total=rates.sum(axis=1).max())
+    return {name: round(float(peak), 1) for name, peak in peaks.items()}
+
+
+def engagement_numbers(hits, gap=ENGAGEMENT_GAP, switch_gap=ENGAGEMENT_SWITCH_GAP):
+    """
+    :hits: dataframe of hits in the order of the log
+    :return: array of the engagement of every hit, numbered from 1, a new one starting after a pause of gap seconds,
+    or of switch_gap seconds if the hit is on another entity than the one before
+    """
+    pauses = hits.Time.diff().dt.total_seconds().to_numpy()[1:]
+    entities = hits.Entity.cat.codes.to_numpy()
+    starts = np.ones(len(hits), dtype=bool)
+    starts[1:] = (pauses > gap) | ((pauses > switch_gap) & (entities[1:] != entities[:-1]))
+    return np.cumsum(starts, dtype='int32')
+
+
+def engagement_stats(hits):
+    """:return: dataframe of the time span, damage, hits and entities per engagement and direction, in one groupby"""
+    stats = hits.groupby(['Engagement', 'Direction'], observed=True).agg(
+        start=('Time', 'min'), end=('Time', 'max'), damage=('Damage', 'sum'), hits=('Damage', 'count'),
+        entities=('Entity', 'nunique'),
+    )
+    return stats.unstack('Direction')
+
+
+def engagement_table(stats):
+    """:return: list of dicts of the engagement stats, in plain python types for the template and the cache"""
+    if stats.empty:
+        return []
+    start, end = stats['start'].min(axis=1), stats['end'].max(axis=1)
+    table = pd.DataFrame({
+        'number': stats.index, 'start': start.dt.strftime('%H:%M:%S'), 'end': end.dt.strftime('%H:%M:%S'),
+        'seconds': (end - start).dt.total_seconds().fillna(0).astype(int),
+    })
+    for direction, name in (('to', 'delivered'), ('from', 'received')):
+        for column in ('damage', 'hits', 'entities'):
+            values = stats[column][direction] if direction in stats[column] else 0
+            table[f'{name}_{column}'] = pd.Series(values, index=stats.index).fillna(0).astype(int)
+    return table.to_dict('records')
+
+
+def stats_table(stats):
+    """:return: dict of index value: damage stats, in plain python types for the template and the cache"""
+    return {
+        name: {'mean': round(float(row['mean']), 1), 'max': int(row['max']), 'sum': int(row['sum']),
+               'count': int(row['count'])}
+        for name, row in stats.iterrows()
+    }
 
 
 class Analyzer:
-    TIMESTAMP_LENGTH = len('2022.11.01 08:29:30')
 
-    def __init__(self, data, session_id='a'):
+    def __init__(self, data, session_id='a', lazy=False, keep_lines=True):
+        """
+        :data: gamelog to analyze, either in the escaped form of a single string or as a text file or other lines
+        :lazy: only preparing the chart data in self.chart_specs, leaving the rendering to the caller
+        :keep_lines: keeping a markup-free copy of the log in context['lines'], which for a large log
+        takes more memory than the whole analysis; the stored log can be read again instead
+        """
         self.context = {}
+        self.chart_specs = {}  # chart name: (chart function, keyword arguments)
+        self.charts = {}  # chart name: png bytes
+        self.lazy = lazy
+        self.keep_lines = keep_lines
+        self.data = data
+        self.plots = Plot(session_id=session_id)
+        self.events = {}
+        self.hit_frames = []  # hits parsed so far, HIT_BATCH at a time
+        self.hits = pd.DataFrame()
+        self.dealt_damage = pd.DataFrame()
+        self.incoming_damage = pd.DataFrame()
+        self.aggregates = {}  # direction: index level: dataframe of damage stats
+        self.neuts = pd.DataFrame()
+        self.timelines = {}  # 'delivered', 'received' and 'neut': dataframe of the rates per second over time
+        self.stages = {}  # stage name: wall and cpu seconds, allocated bytes, see stages.record
         if data:
-            self.data = data
-            self.plots = Plot(session_id=session_id)
-            self.combat_interactions = []
-            self.hits = pd.DataFrame()
-            self.dealt_damage = pd.DataFrame()
-            self.incoming_damage = pd.DataFrame()
             self.run_analysis()
 
+    @instrumented
     def run_analysis(self):
         self.parse_data()
+        self.segment()
         self.build_summary_stats()
+        self.aggregate()
+        self.build_timelines()
         self.build_plots()
 
+    @stage
     def parse_data(self):
         self.get_lines()
-        self.get_combat_interactions()
         self.get_hits()
         self.get_warp_prevention()
         self.get_ewar()
 
+    @stage
+    def segment(self):
+        """splitting the hits into engagements, for the fights of a long session to be told apart"""
+        self.hits['Engagement'] = engagement_numbers(self.hits)
+        self.context['engagements'] = engagement_table(engagement_stats(self.hits))
+
+    @stage
     def build_summary_stats(self):
         # Dealt damage
-        dealt_df = self.hits.loc[self.hits.Direction == 'to']
+        dealt_df = drop_unused_categories(self.hits.loc[self.hits.Direction == 'to'])
         targets = dealt_df.Entity.unique().tolist()
         self.context['targets'] = targets  # list of targets back to view
         player_weapons = dealt_df.Weapon.unique().tolist()
         self.context[
             'player_weapons'] = player_weapons if player_weapons else None  # list of player weapons back to view
         # Incoming damage
-        incoming_df = self.hits.loc[self.hits.Direction == 'from']
+        incoming_df = drop_unused_categories(self.hits.loc[self.hits.Direction == 'from'])
         enemies = incoming_df.Entity.unique().tolist()
         self.context['enemies'] = enemies if enemies else None  # list of enemies back to view
         enemy_weapons = incoming_df.Weapon.unique().tolist()
         self.context['enemy_weapons'] = enemy_weapons
         # Bounties
-        bounty = [
-            line.replace('\xa0', '_') for line in self.context['lines'
-            ] if " (bounty) " in line[:self.TIMESTAMP_LENGTH + len(' (bounty) ') + 2
-                                 ] and " ISK added to next bounty payout" in line
-        ]
-        bounty = sum([int(line.split(' (bounty) ', 1)[1].split(' ')[0]) for line in bounty])
-        self.context['bounty'] = bounty
+        self.context['bounty'] = sum(amount for _, amount in self.events[BOUNTY])
         self.dealt_damage = dealt_df
         self.incoming_damage = incoming_df
 
+    @stage
+    def aggregate(self):
+        """computing the damage stats once per direction, for all the plots and the template to share"""
+        for direction, damage in (('to', self.dealt_damage), ('from', self.incoming_damage)):
+            pairs = aggregate_damage(damage)
+            self.aggregates[direction] = {
+                'Pair': pairs, 'Weapon': roll_up(pairs, 'Weapon'), 'Entity': roll_up(pairs, 'Entity')
+            }
+        self.context['delivered_per_weapon'] = stats_table(self.aggregates['to']['Weapon'])
+        self.context['delivered_per_target'] = stats_table(self.aggregates['to']['Entity'])
+        self.context['received_per_enemy'] = stats_table(self.aggregates['from']['Entity'])
+
+    @stage
+    def build_timelines(self):
+        """damage per second per weapon and per enemy and the incoming neut pressure, over a rolling window"""
+        self.timelines = {
+            'delivered': rate_timeline(self.dealt_damage, 'Damage', 'Weapon'),
+            'received': rate_timeline(self.incoming_damage, 'Damage', 'Entity'),
+            'neut': rate_timeline(self.neuts, 'Amount', 'Source'),
+        }
+        self.context['timeline_window'] = TIMELINE_WINDOW
+        self.context['peak_dps_delivered'] = peak_rates(self.timelines['delivered'])
+        self.context['peak_dps_received'] = peak_rates(self.timelines['received'])
+        self.context['peak_neut_pressure'] = peak_rates(self.timelines['neut'])
+
+    def chart_stats(self, direction, level):
+        """:return: the damage stats per weapon or entity as charted, the long tail lumped together"""
+        return lump_tail(self.aggregates[direction][level], {level: CHART_TOP})
+
+    def pair_scores(self, direction, stat):
+        """:return: dataframe of a damage stat per weapon and entity, as drawn by the damage grids"""
+        pairs = lump_tail(self.aggregates[direction]['Pair'], GRID_TOP)
+        return pairs[[stat]].rename(columns={stat: 'Damage'}).sort_values(by='Entity')
+
+    @stage
     def build_plots(self):
         if self.context['player_weapons']:
             self.plot_weapon_performance_per_hit()
@@ -121,59 +421,55 @@ class Analyzer:
             self.plot_mean_received()
             self.plot_top_received()
             self.plot_total_received()
-
+        self.plot_timelines()
+        if not self.lazy:
+            with record(self.stages, 'render_charts'):
+                self.charts = render_charts(self.chart_specs)
+            self.save_plots()
+
+    def add_chart(self, name, chart, **kwargs):
+        if PNG_COMPRESS_LEVEL is not None:
+            kwargs['compress_level'] = PNG_COMPRESS_LEVEL
+        self.chart_specs[name] = (chart, kwargs)
+
+    @stage
+    def save_plots(self):
+        if not self.charts:
+            return
+        for name, image in self.charts.items():
+            if PLOT_STORAGE == 'files':
+                image = store_reference(self.plots.session_id, name, image)
+            setattr(self.plots, PLOT_FIELDS[name], image)
+        with transaction.atomic():  # a single write of all the charts of the analysis
+            self.plots.save()
+
+    @stage
     def get_lines(self):
-        lines = self.data.replace('\\xc2\\xa0', '_').split('\\r\\n')
-        lines = [re.sub('<.+?>', '',  # replacing each tag with empty string
-                        line.strip()) for line in lines]
-
-        self.context['lines'] = lines  # log as a list of lines back to view
+        """single pass over the log sorting the lines into combat and bounty events, the lines being read one by one"""
+        lines = iter_escaped_lines(self.data) if isinstance(self.data, str) else iter_text_lines(self.data)
+        tokenizer = Tokenizer(keep_lines=self.keep_lines, keep_misses=False)  # no analysis of the misses yet
+        hits = tokenizer.events[HIT]
+        for line in lines:
+            tokenizer.feed_line(line)
+            if len(hits) >= HIT_BATCH:
+                self.hit_frames.append(hits_frame(hits))
+                hits.clear()
+        self.events = tokenizer.events
+        if self.keep_lines:
+            self.context['lines'] = tokenizer.lines  # log as a list of lines back to view
         self.context['processed'] = True
 
-    def get_combat_interactions(self):
-        lines = [line for line in self.context['lines'] if line.startswith('[ ')]  # taking only timestamped lines
-        lines = [line.strip('[ ').replace(' ]', '') for line in lines]  # cleaning the timestamps
-        combat = [
-            line for line in lines if ' (combat) ' in line[:self.TIMESTAMP_LENGTH + len(' (combat) ') + 2]
-        ]
-        combat = [line.replace('(combat)', '-', 1) for line in
-                  combat]  # also replacing '(combat)' with '-' to use as column separator
-        self.combat_interactions = combat
-
+    @stage
     def get_hits(self):
         """pulling all damage-dealing hits into a dataframe"""
-        hits = [
-            line for line in self.combat_interactions if (
-                                                             line.endswith('- Grazes')) or (  # hit quality tokens
-                                                             line.endswith('- Hits')) or (
-                                                             line.endswith('- Glances Off')) or (
-                                                             line.endswith('- Smashes')) or (
-                                                             line.endswith('- Penetrates')) or (
-                                                             line.endswith('- Wrecks')
-                                                         )
-        ]
-        # preparing the list for data-framing by turning each entry into a row of cells
-        # installing column separators '-' and performing the split
-        hits = [line.replace(' to ', ' - to - ').replace(' from ', ' - from - ').split(' - ') for line in hits]
-        # inserting 'Unknown' for missing enemy weapon data
-        for entry in hits:
-            if len(entry) != 6:
-                entry.insert(-1, 'Unknown')
-
-        columns = ['Time', 'Damage', 'Direction', 'Entity', 'Weapon', 'Token']
-        # Creating the damage exchange dataframe
-        hits_df = pd.DataFrame(data=hits, columns=columns)
-        hits_df.Damage = hits_df.Damage.astype('int')  # Casting the damage scores to integer
-        self.hits = hits_df
+        self.hit_frames.append(hits_frame(self.events[HIT]))
+        self.events[HIT] = []  # in the dataframe from now on
+        self.hits = concat_hits(self.hit_frames)
+        self.hit_frames = []
 
+    @stage
     def get_warp_prevention(self):
-        warp_prevention = [line for line in self.combat_interactions if line.split(
-            ' - ', 1)[1].startswith('Warp ') and ' attempt from ' in line]
-        warp_prevention_df = pd.DataFrame(
-            data=[line.replace("from", "-").replace("to", "-").replace('attempt ', '')
-                  .rstrip('!').split(' - ') for line in warp_prevention],
-            columns=['Time', 'Action', 'Issuer', 'Recipient']
-        )
+        warp_prevention_df = pd.DataFrame(data=self.events[WARP], columns=['Time', 'Action', 'Issuer', 'Recipient'])
         received = warp_prevention_df[warp_prevention_df.Recipient == "you"].drop(columns="Recipient")
         incoming_warp_prevention = {}
         for action in received.Action.unique():
@@ -181,187 +477,135 @@ class Analyzer:
 
         self.context['incoming_warp_prevention'] = incoming_warp_prevention
 
+    @stage
     def get_ewar(self):
-        neut = [
-            line.replace(
-                'GJ energy neutralized', '-', 1
-            ) for line in self.combat_interactions if ' GJ energy neutralized ' in line[:self.TIMESTAMP_LENGTH + len(
-                ' GJ energy neutralized '
-            ) + 5]
-        ]
-        neuters = {}
-        for line in neut:
-            sliced = line.split(' - ')
-            candidate = sliced[-1]
-            if sliced[-2] == candidate:
-                if candidate not in neuters.keys():
-                    neuters[candidate] = []
-                neuters[candidate].append(int(sliced[1]))
-        for entity in neuters.keys():
-            neuters[entity] = max(neuters.get(entity))
-        self.context['neuters'] = neuters
-
+        neuts = pd.DataFrame(data=self.events[NEUT], columns=['Time', 'Amount', 'Source', 'Target'])
+        neuts['Time'] = pd.to_datetime(neuts.Time, format=TIME_FORMAT, errors='coerce')
+        self.neuts = neuts[neuts.Source == neuts.Target]  # neutralizing you, the ship named twice
+        self.context['neuters'] = {
+            neuter: int(amount) for neuter, amount in self.neuts.groupby('Target', sort=False).Amount.max().items()
+        }
+
+    @stage
     def plot_weapon_performance_per_hit(self):
-        # data for plotting
-        means_per_weapon = self.dealt_damage.groupby(['Weapon']).Damage.mean()  # .sort_values(ascending=False)
-        tops_per_weapon = self.dealt_damage.groupby(['Weapon']).Damage.max()  # .sort_values(ascending=False)
+        per_weapon = self.chart_stats('to', 'Weapon')
         # bar charts of mean and top damage scores per weapon
-        plt.figure(figsize=(10, 3.5), facecolor='white')
-        # plt.subplots(layout="constrained")
-        plt.subplot(121)
-        means_per_weapon.plot(
-            kind='bar', ylabel='', title='Overall mean damage per hit',
-            color='darkorange', alpha=.85
+        self.add_chart(
+            'delivered_overall_bars', charts.bar_pair, left=per_weapon['mean'], right=per_weapon['max'],
+            titles=('Overall mean damage per hit', 'Overall top damage per hit'),
+            color='darkorange', figsize=(10, 3.5)
         )
-        plt.subplot(122)
-        tops_per_weapon.plot(
-            kind='bar', ylabel='', title='Overall top damage per hit',
-            color='darkorange', alpha=.85
-        )
-        name = 'delivered_overall_bars'
-        save_path = f"main/static/main/images/chart_{name}.png"
-        plt.savefig(image_dir_prefix + save_path, bbox_inches='tight', pad_inches=0.2)
-        # Convert the plot to a binary image
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        image_data = buffer.getvalue()
-        # Save the plot to the database
-        self.plots.mean_delivered = image_data
-        self.plots.save()
-        plt.close()
 
+    @stage
     def plot_weapon_performance_totals(self):
-        # data for plotting
-        totals_per_weapon = self.dealt_damage.groupby(['Weapon']).Damage.sum().sort_values(ascending=False)
-        hits_per_weapon = self.dealt_damage.Weapon.value_counts()
+        per_weapon = self.chart_stats('to', 'Weapon')
         # piecharts of total damage and hit counts per weapon
-        plt.figure(figsize=(12.5, 3.5), facecolor='white')
-        plt.subplot(121,
-                    xlabel=f'Total: {sum(totals_per_weapon)}')  # plotting total damage per weapon
-        totals_per_weapon.plot(
-            kind='pie', title='Total damage across weapon types', ylabel='',
-            # radius=1.1,
-            labeldistance=1.2,
-            cmap='Oranges_r',
-            startangle=45,
-            explode=pie_exploder(totals_per_weapon)
-        )
-        plt.subplot(122,
-                    xlabel=f'Total: {sum(hits_per_weapon)}')  # plotting total number of hits per weapon
-        hits_per_weapon.plot(
-            kind='pie', title='Total hit count across weapon types', ylabel='',
-            # radius=.9,
-            labeldistance=1.2,
-            cmap='Oranges_r',
-            startangle=45,
-            explode=pie_exploder(hits_per_weapon)
+        self.add_chart(
+            'delivered_totals_pies', charts.pie_pair,
+            left=per_weapon['sum'].sort_values(ascending=False), right=per_weapon['count'].sort_values(ascending=False),
+            titles=('Total damage across weapon types', 'Total hit count across weapon types'),
+            cmap='Oranges_r', figsize=(12.5, 3.5)
         )
-        name = 'delivered_totals_pies'
-        save_path = f"main/static/main/images/chart_{name}.png"
-        plt.savefig(image_dir_prefix + save_path)
-        plt.close()
 
+    @stage
     def plot_mean_delivered(self):
-        mean_damage_scores = pd.DataFrame(self.dealt_damage.groupby(['Weapon', 'Entity']).Damage.mean()).sort_values(
-            by='Entity').astype('int')
-        self.plots.mean_delivered = plot_damage_grid(
-            mean_damage_scores, 'Oranges',
-            'Mean damage per hit across targets',
-            "mean_delivered"
+        self.add_chart(
+            'mean_delivered', charts.damage_grid, data=self.pair_scores('to', 'mean').astype('int'), palette='Oranges',
+            title='Mean damage per hit across targets'
         )
 
+    @stage
     def plot_top_delivered(self):
-        top_damage_scores = pd.DataFrame(
-            self.dealt_damage.groupby(['Weapon', 'Entity']).Damage.max()
-        ).sort_values(by='Entity')
-        self.plots.top_delivered = plot_damage_grid(
-            top_damage_scores, 'Oranges',
-            title='Top damage per hit across targets',
-            name="top_delivered"
+        self.add_chart(
+            'top_delivered', charts.damage_grid, data=self.pair_scores('to', 'max'), palette='Oranges',
+            title='Top damage per hit across targets'
         )
 
+    @stage
     def plot_incoming_per_hit(self):
-        # Data for plotting
-        means_per_enemy = self.incoming_damage.groupby(['Entity']).Damage.mean()
-        tops_per_enemy = self.incoming_damage.groupby(['Entity']).Damage.max()
+        per_enemy = self.chart_stats('from', 'Entity')
         #  bar charts of mean and top damage taken from each enemy
-        plt.figure(figsize=(11, 4))
-        plt.subplot(121)
-        means_per_enemy.plot(
-            kind='bar', ylabel='', title='Overall mean damage per enemy hit',
-            color='darkred', alpha=.85
-        )
-        plt.subplot(122)
-        tops_per_enemy.plot(
-            kind='bar', ylabel='', title='Overall top damage per enemy hit',
-            color='darkred', alpha=.85
+        self.add_chart(
+            'received_overall_bars', charts.bar_pair, left=per_enemy['mean'], right=per_enemy['max'],
+            titles=('Overall mean damage per enemy hit', 'Overall top damage per enemy hit'),
+            color='darkred', figsize=(11, 4)
         )
-        name = 'received_overall_bars'
-        save_path = f"main/static/main/images/chart_{name}.png"
-        plt.savefig(image_dir_prefix + save_path, bbox_inches='tight', pad_inches=0.2)
-        plt.close()
 
+    @stage
     def plot_incoming_totals(self):
-        # data for plotting
-        totals_per_enemy = self.incoming_damage.groupby(['Entity']).Damage.sum().sort_values(ascending=False)
-        hits_per_enemy = self.incoming_damage.Entity.value_counts()
+        per_enemy = self.chart_stats('from', 'Entity')
         # piecharts of total damage and hit counts from each enemy
         height = 3.5  # overall for the figure
         radius = 1  # for each pie
-        if len(self.context['enemies']) > 11:  # to provide more space for labels
+        if len(per_enemy) > 11:  # to provide more space for labels
             height = 5
             radius = .7
-        plt.figure(figsize=(12, height), facecolor='white')
-        plt.subplot(121,
-                    xlabel=f'Total: {sum(totals_per_enemy)}')  # plotting total damage per enemy
-        totals_per_enemy.plot(
-            kind='pie', title='Total incoming damage across kinds of enemies', ylabel='',
-            radius=radius,
-            labeldistance=1.2,
-            cmap='Reds_r',
-            startangle=45,
-            explode=pie_exploder(totals_per_enemy)
+        self.add_chart(
+            'received_totals_pies', charts.pie_pair,
+            left=per_enemy['sum'].sort_values(ascending=False), right=per_enemy['count'].sort_values(ascending=False),
+            titles=(
+                'Total incoming damage across kinds of enemies', 'Total incoming hit count across kinds of enemies'
+            ),
+            cmap='Reds_r', figsize=(12, height), radius=radius
         )
-        plt.subplot(122,
-                    xlabel=f'Total: {sum(hits_per_enemy)}')  # plotting total number of hits per enemy
-        hits_per_enemy.plot(
-            kind='pie', title='Total incoming hit count across kinds of enemies', ylabel='',
-            radius=radius,
-            labeldistance=1.2,
-            cmap='Reds_r',
-            startangle=45,
-            explode=pie_exploder(hits_per_enemy)
-        )
-        name = 'received_totals_pies'
-        save_path = f"main/static/main/images/chart_{name}.png"
-        plt.savefig(image_dir_prefix + save_path)
-        plt.close()
 
+    @stage
     def plot_mean_received(self):
-        mean_damage_scores = pd.DataFrame(
-            self.incoming_damage.groupby(['Weapon', 'Entity']).Damage.mean()
-        ).sort_values(by='Entity').astype(int)
-        self.plots.mean_received = plot_damage_grid(
-            mean_damage_scores, 'Reds',
-            'Mean incoming damage per hit across enemies',
-            "mean_received"
+        self.add_chart(
+            'mean_received', charts.damage_grid, data=self.pair_scores('from', 'mean').astype(int), palette='Reds',
+            title='Mean incoming damage per hit across enemies'
         )
-        self.plots.save()
 
+    @stage
     def plot_top_received(self):
-        top_damage_scores = pd.DataFrame(self.incoming_damage.groupby(['Weapon', 'Entity']).Damage.max()).sort_values(
-            by='Entity')
-        self.plots.top_received = plot_damage_grid(
-            top_damage_scores, 'Reds',
-            'Top incoming damage per hit across enemies',
-            "top_received"
+        self.add_chart(
+            'top_received', charts.damage_grid, data=self.pair_scores('from', 'max'), palette='Reds',
+            title='Top incoming damage per hit across enemies'
         )
-        self.plots.save()
 
+    @stage
     def plot_total_received(self):
-        totals = pd.DataFrame(self.incoming_damage.groupby(['Weapon', 'Entity']).Damage.sum()).sort_values(by='Entity')
-        self.plots.total_received = plot_damage_grid(totals, 'Reds',
-                                                     'Total incoming damage across enemies and their weapons',
-                                                     "total_received"
-                                                     )
-        self.plots.save()
+        self.add_chart(
+            'total_received', charts.damage_grid, data=self.pair_scores('from', 'sum'), palette='Reds',
+            title='Total incoming damage across enemies and their weapons'
+        )
+
+    @stage
+    def plot_timelines(self):
+        window = f'{TIMELINE_WINDOW} s window'
+        for name, timeline, title, ylabel, cmap in (
+            ('delivered_timeline', 'delivered', f'Damage per second per weapon ({window})', 'DPS', 'tab10'),
+            ('received_timeline', 'received', f'Incoming damage per second per enemy ({window})', 'DPS', 'tab20'),
+            ('neut_timeline', 'neut', f'Incoming energy neutralization per neuter ({window})', 'GJ/s', 'tab20'),
+        ):
+            if not self.timelines[timeline].empty:
+                self.add_chart(
+                    name, charts.timeline, data=thin_timeline(self.timelines[timeline]), title=title,
+                    ylabel=ylabel, cmap=cmap
+                )
+
+
+class EngagementAnalyzer(Analyzer):
+    """Analyzer of some engagements of an analysis, from its hits rather than its log, for the charts of a fight"""
+
+    def __init__(self, hits, numbers, session_id='a', lazy=True):
+        """
+        :hits: the hits of the whole analysis, their engagements numbered already
+        :numbers: the engagements to analyze
+        """
+        self.all_hits = hits
+        super().__init__(list(numbers), session_id, lazy)
+
+    @stage
+    def parse_data(self):
+        self.events = {kind: [] for kind in EVENT_KINDS}  # warp prevention and neuts are not kept by the analysis
+        selected = self.all_hits.loc[self.all_hits.Engagement.isin(self.data)]
+        self.hits = drop_unused_categories(selected).reset_index(drop=True)
+        self.context['processed'] = True
+        self.get_warp_prevention()
+        self.get_ewar()
+
+    @stage
+    def segment(self):
+        """keeping the engagements of the analysis"""
+        self.context['engagements'] = engagement_table(engagement_stats(self.hits))
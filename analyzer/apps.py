@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AnalyzerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analyzer'
+
+    def ready(self):
+        from . import checks  # noqa: F401, registers the system checks
+        if getattr(settings, 'ANALYZER_PRELOAD', False):
+            from .warmup import warm_up
+            warm_up()
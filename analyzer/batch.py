@@ -0,0 +1,64 @@
+"""
+Analysis of many logs at once, such as a folder of daily gamelogs: the files are parsed in parallel
+worker processes and their hits merged into one data set, summarized and plotted like a single log.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from . import worker
+from .analyze import Analyzer, hits_frame, concat_hits
+from .gamelog import Tokenizer, iter_text_lines, EVENT_KINDS, HIT
+from .logs import iter_decoded_lines
+from .stages import stage
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def parse_log_file(path):
+    """
+    :path: gamelog file
+    :return: events of the log, hits being returned as a dataframe instead of the raw lines
+    """
+    with open(path, 'rb') as f:
+        lines = iter_decoded_lines(iter(partial(f.read, CHUNK_SIZE), b''))
+        events = Tokenizer(keep_lines=False, keep_misses=False).feed(iter_text_lines(lines)).events  # misses unused
+    hits = hits_frame(events[HIT])
+    events[HIT] = []
+    return events, hits
+
+
+def merge_hits(frames):
+    """:return: hits of all the logs in one dataframe ordered by time, categories being merged as well"""
+    return concat_hits(frames).sort_values('Time', kind='stable').reset_index(drop=True)
+
+
+class BatchAnalyzer(Analyzer):
+    """Analyzer of several log files, producing the context and chart specs of the combined data set"""
+
+    def __init__(self, paths, workers=None, session_id='a', lazy=True):
+        """
+        :paths: gamelog files to analyze
+        :workers: number of parsing processes, the number of CPUs if None
+        :lazy: left to the caller to render the chart specs, a batch having no Plot row of its own to save them to
+        """
+        self.workers = workers
+        self.file_hits = []
+        super().__init__(list(paths), session_id, lazy)
+
+    @stage
+    def get_lines(self):
+        with ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=worker.setup
+        ) as pool:
+            parsed = list(pool.map(parse_log_file, self.data))
+        self.events = {kind: [event for events, _ in parsed for event in events[kind]] for kind in EVENT_KINDS}
+        self.file_hits = [hits for _, hits in parsed]
+        self.context['lines'] = []  # not showing the raw text of a whole folder of logs
+        self.context['logs'] = len(self.data)
+        self.context['processed'] = True
+
+    @stage
+    def get_hits(self):
+        self.hits = merge_hits(self.file_hits)
+        self.file_hits = []
@@ -0,0 +1,131 @@
+"""
+Benchmarks of the analysis stages on synthetic logs: every stage of Analyzer.run_analysis is timed on its own,
+the charts being rendered one by one after the plot methods have prepared them, with the throughput and
+the peak memory per log size. The results are plain dicts saved as JSON, to compare versions against each other.
+"""
+import datetime
+import functools
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict
+
+import matplotlib
+import pandas as pd
+
+from .analyze import Analyzer
+from .synthetic import generate_lines, escaped_log
+
+PARSE_STAGES = ('get_lines', 'get_hits', 'get_warp_prevention', 'get_ewar')
+SUMMARY_STAGES = ('segment', 'build_summary_stats', 'aggregate', 'build_timelines')
+PLOT_STAGES = (  # in the order of build_plots
+    'plot_weapon_performance_per_hit', 'plot_weapon_performance_totals', 'plot_mean_delivered', 'plot_top_delivered',
+    'plot_incoming_per_hit', 'plot_incoming_totals', 'plot_mean_received', 'plot_top_received', 'plot_total_received',
+    'plot_timelines',
+)
+
+
+def stage_calls(analyzer):
+    """:return: generator of (stage name, callable) in the order of run_analysis, rendering included"""
+    for name in PARSE_STAGES + SUMMARY_STAGES + PLOT_STAGES:
+        yield name, getattr(analyzer, name)
+    for name, (chart, kwargs) in list(analyzer.chart_specs.items()):  # prepared by the plot stages by now
+        yield f'render:{name}', functools.partial(chart, **kwargs)
+
+
+def new_analyzer(data):
+    analyzer = Analyzer(None, lazy=True)
+    analyzer.data = data
+    return analyzer
+
+
+def measure(data, repeat=3, trace_memory=True):
+    """
+    :data: gamelog in the escaped form
+    :repeat: number of timed runs, the fastest one counting
+    :trace_memory: also making an untimed run under tracemalloc for the peak memory of each stage
+    :return: dict of stage name: {'seconds', 'peak_bytes'}, peak_bytes being None without trace_memory
+    """
+    seconds = defaultdict(list)
+    for _ in range(repeat):
+        for name, call in stage_calls(new_analyzer(data)):
+            start = time.perf_counter()
+            call()
+            seconds[name].append(time.perf_counter() - start)
+    peaks = {}
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            for name, call in stage_calls(new_analyzer(data)):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                call()
+                peaks[name] = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    return {name: {'seconds': min(times), 'peak_bytes': peaks.get(name)} for name, times in seconds.items()}
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes, enemies=8, player_weapons=4, enemy_weapons=4, repeat=3, seed=0, trace_memory=True):
+    """
+    :sizes: numbers of lines of the synthetic logs to analyze
+    :return: dict of the 'meta' data of the run, its 'params' and the results of every log size in 'runs'
+    """
+    runs = []
+    for size in sizes:
+        data = escaped_log(generate_lines(size, enemies, player_weapons, enemy_weapons, seed))
+        megabytes = len(data.encode()) / 2 ** 20
+        stages = measure(data, repeat, trace_memory)
+        total = sum(stage['seconds'] for stage in stages.values())
+        parse = sum(stages[name]['seconds'] for name in PARSE_STAGES)
+        runs.append({
+            'lines': size,
+            'bytes': len(data.encode()),
+            'stages': stages,
+            'total_seconds': total,
+            'lines_per_second': size / total,
+            'mb_per_second': megabytes / total,
+            'parse_lines_per_second': size / parse,
+            'parse_mb_per_second': megabytes / parse,
+            'peak_bytes': max(stage['peak_bytes'] for stage in stages.values()) if trace_memory else None,
+        })
+    return {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__,
+            'machine': platform.machine(),
+        },
+        'params': {
+            'enemies': enemies, 'player_weapons': player_weapons, 'enemy_weapons': enemy_weapons,
+            'repeat': repeat, 'seed': seed,
+        },
+        'runs': runs,
+    }
+
+
+def compare(current, previous):
+    """:return: list of (lines, stage, previous seconds, current seconds) for the log sizes and stages of both"""
+    previous_runs = {run['lines']: run for run in previous['runs']}
+    rows = []
+    for run in current['runs']:
+        before = previous_runs.get(run['lines'])
+        if before is None:
+            continue
+        for name, stage in run['stages'].items():
+            if name in before['stages']:
+                rows.append((run['lines'], name, before['stages'][name]['seconds'], stage['seconds']))
+        rows.append((run['lines'], 'total', before['total_seconds'], run['total_seconds']))
+    return rows
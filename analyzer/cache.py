@@ -0,0 +1,58 @@
+import pickle
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+# analysis results live in one of the configured django caches, which takes care of LRU and TTL eviction
+CACHE_ALIAS = getattr(settings, 'ANALYZER_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'ANALYZER_CACHE_TIMEOUT', 60 * 60 * 24)  # seconds
+CACHE_MAX_BYTES = getattr(settings, 'ANALYZER_CACHE_MAX_BYTES', 16 * 1024 * 1024)  # results above are not cached
+KEY_PREFIX = 'analyzer:analysis:'
+ENGAGEMENT_PREFIX = 'analyzer:engagement:'  # followed by <log hash>:<engagement number>
+# zlib level of the pickled analyses kept in the cache and in the job rows, None storing them uncompressed
+RESULT_COMPRESS_LEVEL = getattr(settings, 'ANALYZER_RESULT_COMPRESS_LEVEL', 6)
+PICKLE_START = pickle.PROTO + bytes([pickle.HIGHEST_PROTOCOL])  # blobs starting otherwise are compressed
+
+
+def dump_analysis(analysis):
+    """:return: bytes of the analysis dict, pickled and compressed"""
+    blob = pickle.dumps(analysis, pickle.HIGHEST_PROTOCOL)
+    return blob if RESULT_COMPRESS_LEVEL is None else zlib.compress(blob, RESULT_COMPRESS_LEVEL)
+
+
+def load_analysis(blob):
+    """:blob: bytes made by dump_analysis, compressed or not, or a memoryview of them as some databases return"""
+    blob = bytes(blob)
+    return pickle.loads(blob if blob.startswith(PICKLE_START) else zlib.decompress(blob))
+
+
+def get_analysis(key):
+    """
+    :return: dict of 'context', chart 'specs' (name: (chart function, keyword arguments)), 'hits' dataframe
+    and analysis 'stages' records (None for analyses stored without them) for the log hash
+    """
+    blob = caches[CACHE_ALIAS].get(KEY_PREFIX + key)
+    return load_analysis(blob) if blob is not None else None
+
+
+def set_analysis(key, context, specs, hits=None, stages=None):
+    blob = dump_analysis({'context': context, 'specs': specs, 'hits': hits, 'stages': stages})
+    if len(blob) > CACHE_MAX_BYTES:
+        return False
+    caches[CACHE_ALIAS].set(KEY_PREFIX + key, blob, CACHE_TIMEOUT)
+    return True
+
+
+def get_engagement(key, number):
+    """:return: dict of 'context' and chart 'specs' of one engagement of the analysis of the log hash"""
+    blob = caches[CACHE_ALIAS].get(f'{ENGAGEMENT_PREFIX}{key}:{number}')
+    return load_analysis(blob) if blob is not None else None
+
+
+def set_engagement(key, number, context, specs):
+    blob = dump_analysis({'context': context, 'specs': specs})
+    if len(blob) > CACHE_MAX_BYTES:
+        return False
+    caches[CACHE_ALIAS].set(f'{ENGAGEMENT_PREFIX}{key}:{number}', blob, CACHE_TIMEOUT)
+    return True
@@ -0,0 +1,110 @@
+"""
+Chart renderers built on the object-oriented matplotlib API: each one draws its own Figure,
+leaving the pyplot state machine alone, and returns the encoded PNG, so that the charts of an analysis
+can be rendered independently of each other, in worker processes if needed.
+"""
+import functools
+from io import BytesIO
+
+import numpy as np
+import matplotlib
+import seaborn as sns
+from matplotlib.figure import Figure
+
+matplotlib.use("Agg")
+
+
+def pie_exploder(vals):
+    """
+    :vals: values to be represented by the pie wedges, sorted in descending order for best results
+    :return: array of explode values for pie charts to only explode very narrow wedges,
+    every further tiny wedge (under 3% of the total) exploding .09 more than the one before
+    """
+    vals = np.asarray(vals, dtype=float)
+    tiny = vals < .03 * vals.sum()
+    explode = np.full(len(vals), .01)  # default explode value for all wedges
+    explode[tiny] += .09 * np.arange(np.count_nonzero(tiny))
+    return explode
+
+
+def styled(chart):
+    """applying the analyzer visualization style for the duration of the rendering only"""
+    @functools.wraps(chart)
+    def wrapper(*args, **kwargs):
+        with sns.axes_style("whitegrid"), sns.plotting_context("notebook", font_scale=.9):
+            return chart(*args, **kwargs)
+    return wrapper
+
+
+def encode(figure, compress_level=None, **kwargs):
+    """
+    :compress_level: zlib level of the png, lower levels trading size for encoding time, matplotlib default if None
+    :return: png bytes of the figure, encoded once to be shared by all the sinks
+    """
+    if compress_level is not None:
+        kwargs['pil_kwargs'] = {'compress_level': compress_level}
+    buf = BytesIO()
+    figure.savefig(buf, format='png', **kwargs)
+    return buf.getvalue()
+
+
+@styled
+def bar_pair(left, right, titles, color, figsize, compress_level=None):
+    """side by side bar charts of two series sharing the index, such as mean and top damage per hit"""
+    figure = Figure(figsize=figsize, facecolor='white')
+    for position, series, title in zip((121, 122), (left, right), titles):
+        series.plot(
+            kind='bar', ylabel='', title=title,
+            color=color, alpha=.85, ax=figure.add_subplot(position)
+        )
+    return encode(figure, compress_level, bbox_inches='tight', pad_inches=0.2)
+
+
+@styled
+def pie_pair(left, right, titles, cmap, figsize, radius=1, compress_level=None):
+    """side by side pie charts of two series, such as total damage and hit count, with their totals below"""
+    figure = Figure(figsize=figsize, facecolor='white')
+    for position, series, title in zip((121, 122), (left, right), titles):
+        series.plot(
+            kind='pie', title=title, ylabel='',
+            radius=radius,
+            labeldistance=1.2,
+            cmap=cmap,
+            startangle=45,
+            explode=pie_exploder(series),
+            ax=figure.add_subplot(position, xlabel=f'Total: {sum(series)}')
+        )
+    return encode(figure, compress_level)
+
+
+@styled
+def damage_grid(data, palette, title, compress_level=None):
+    """
+    :data: dataframe of damage scores indexed by weapon and entity
+    :return: scatter grid of weapons against entities with the damage shown by marker size and color
+    """
+    figure = Figure(figsize=(12, 4))
+    ax = figure.add_subplot()
+    sns.scatterplot(y="Weapon", x="Entity", hue="Damage", size='Damage',
+                    data=data.reset_index(),
+                    linewidth=1, edgecolor='gray',
+                    palette=palette, sizes=(50, 250), ax=ax
+                    )
+    sns.move_legend(ax, 'center left', bbox_to_anchor=(1, .5), frameon=False)
+    sns.despine(ax=ax)
+    ax.tick_params(axis='x', rotation=90)
+    ax.set_title(title)
+    return encode(figure, compress_level, bbox_inches='tight')
+
+
+@styled
+def timeline(data, title, ylabel, cmap, figsize=(12, 4), compress_level=None):
+    """
+    :data: dataframe of rates over time, one column per line, indexed by time
+    :return: line chart of the rates, the legend beside it
+    """
+    figure = Figure(figsize=figsize, facecolor='white')
+    ax = figure.add_subplot()
+    data.plot(ax=ax, colormap=cmap, linewidth=1.2, title=title, ylabel=ylabel, xlabel='')
+    ax.legend(loc='center left', bbox_to_anchor=(1, .5), frameon=False)
+    return encode(figure, compress_level, bbox_inches='tight')
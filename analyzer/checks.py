@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# cache backends local to a process, which the live analyses and their locks can't be shared through
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register()
+def check_storage_roots(app_configs, **kwargs):
+    """the logs and charts are kept in directories of the site's own, which have no default"""
+    from . import logs, storage
+    roots = (
+        ('ANALYZER_LOG_ROOT', logs.LOG_ROOT, 'analyzer.E001'),
+        ('ANALYZER_CHART_ROOT', storage.CHART_ROOT, 'analyzer.E002'),
+    )
+    return [
+        Error(f'{setting} is not set', id=error_id,
+              hint='Set it to a directory readable by the site only, not a shared temporary one.')
+        for setting, root, error_id in roots if not root
+    ]
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """the chunks of a live analysis may be posted to any of the processes serving the site"""
+    from .cache import CACHE_ALIAS
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND')
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Warning(f'the {CACHE_ALIAS!r} cache of the analyses is local to each process',
+                        hint='Live analyses need a cache shared by the processes serving the site, '
+                             'such as a database, file based, Redis or Memcached one.',
+                        id='analyzer.W001')]
+    return []
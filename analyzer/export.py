@@ -0,0 +1,44 @@
+"""
+Structured exports of an analysis for downstream tooling: the hit rows as an Arrow IPC file or as Parquet,
+encoded by pyarrow straight from the dataframe columns, categories becoming dictionary arrays,
+and the summary stats as compact JSON.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# export format: content type of the hit rows
+HITS_FORMATS = {
+    'arrow': 'application/vnd.apache.arrow.file',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def summary_context(context):
+    """:return: the context of an analysis without the log lines, which the summary stats are about"""
+    return {key: value for key, value in context.items() if key != 'lines'}
+
+
+def summary_json(context):
+    return json.dumps(summary_context(context), cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def encode_hits(hits, fmt):
+    """
+    :hits: dataframe of hits as produced by analyze.hits_frame
+    :fmt: one of HITS_FORMATS
+    :return: bytes of the hit rows in the format
+    """
+    import pyarrow as pa  # optional, without it the hit exports are unavailable while the summary still is
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(hits, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if fmt == 'arrow':
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == 'parquet':
+        pq.write_table(table, sink)
+    else:
+        raise ValueError(f'Unknown hits format {fmt}')
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,113 @@
+import re
+
+TIMESTAMP_LENGTH = len('2022.11.01 08:29:30')
+BODY_OFFSET = len('[ 2022.11.01 08:29:30 ] ')  # where the channel marker starts in a timestamped line
+
+TAG = re.compile('<.+?>')
+
+# hit quality tokens closing every damage-dealing combat line
+HIT_TOKENS = ('- Grazes', '- Hits', '- Glances Off', '- Smashes', '- Penetrates', '- Wrecks')
+# hit body such as '312 to Tetrimon Oracle - Inferno Heavy Missile - Hits', enemy weapon being optional
+HIT_PATTERN = re.compile(
+    r'^(?P<Damage>\d+) (?P<Direction>to|from) (?P<Entity>.+?)(?: - (?P<Weapon>.+?))?'
+    r' - (?P<Token>Grazes|Hits|Glances Off|Smashes|Penetrates|Wrecks)$'
+)
+TIME_FORMAT = '%Y.%m.%d %H:%M:%S'
+
+# event kinds the tokenizer sorts combat and bounty lines into
+HIT = 'hit'
+MISS = 'miss'
+NEUT = 'neut'
+WARP = 'warp'
+BOUNTY = 'bounty'
+EVENT_KINDS = (HIT, MISS, NEUT, WARP, BOUNTY)
+
+
+def strip_tags(line):
+    """removing the game client markup, skipping the regex for lines that have none"""
+    return TAG.sub('', line) if '<' in line else line
+
+
+def iter_escaped_lines(data):
+    """
+    :data: gamelog as kept by the upload view: repr of the file bytes with literal '\\r\\n' line separators
+    :return: generator of log lines, produced one by one instead of splitting the whole log up front
+    """
+    separator = '\\r\\n'
+    start = 0
+    while True:
+        end = data.find(separator, start)
+        if end == -1:
+            yield data[start:].replace('\\xc2\\xa0', '_')
+            return
+        yield data[start:end].replace('\\xc2\\xa0', '_')
+        start = end + len(separator)
+
+
+def iter_text_lines(lines):
+    """
+    :lines: decoded log lines, such as a stored log file
+    :return: generator of the lines with non-breaking spaces replaced the same way as in the escaped form
+    """
+    for line in lines:
+        yield line.replace('\xa0', '_')
+
+
+class Tokenizer:
+    """
+    Sorts gamelog lines into hit, miss, neut, warp scramble and bounty events in a single pass.
+    Events are collected per kind in self.events as tuples starting with the timestamp:
+    hit, miss: (time, body)
+    neut: (time, amount, source, target)
+    warp: (time, action, issuer, recipient)
+    bounty: (time, amount)
+    """
+
+    def __init__(self, keep_lines=True, keep_misses=True):
+        self.lines = [] if keep_lines else None  # markup-free copy of the log for the view
+        self.keep_misses = keep_misses  # misses taking as much memory as hits, for those not using them
+        self.events = {kind: [] for kind in EVENT_KINDS}
+
+    def feed(self, lines):
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line):
+        line = line.strip()
+        if self.lines is not None:
+            line = strip_tags(line)
+            self.lines.append(line)
+        if not line.startswith('[ '):  # taking only timestamped lines
+            return
+        time, rest = line[2:2 + TIMESTAMP_LENGTH], line[BODY_OFFSET:]
+        if rest.startswith('(combat) '):
+            self.feed_combat(time, strip_tags(rest[len('(combat) '):]))
+        elif rest.startswith('(bounty) '):
+            self.feed_bounty(time, strip_tags(rest[len('(bounty) '):]))
+
+    def feed_combat(self, time, body):
+        if body.endswith(HIT_TOKENS):
+            self.events[HIT].append((time, body))
+            return
+        amount, neutralized, parties = body.partition(' GJ energy neutralized ')
+        if neutralized and amount.isdigit():
+            source, _, target = parties.rpartition(' - ')
+            self.events[NEUT].append((time, int(amount), source, target))
+            return
+        if body.startswith('Warp ') and ' attempt from ' in body:
+            action, _, parties = body.rstrip('!').partition(' attempt from ')
+            issuer, _, recipient = parties.rpartition(' to ')
+            self.events[WARP].append((time, action, issuer, recipient))
+            return
+        if self.keep_misses and ' misses ' in body:
+            self.events[MISS].append((time, body))
+
+    def feed_bounty(self, time, body):
+        if ' ISK added to next bounty payout' not in body:
+            return
+        try:  # thousands are separated with non-breaking spaces, which int() accepts once turned to '_'
+            amount = int(body.replace('\xa0', '_').split(' ', 1)[0])
+        except ValueError:
+            return
+        self.events[BOUNTY].append((time, amount))
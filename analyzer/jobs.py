@@ -0,0 +1,213 @@
+import functools
+import logging
+import multiprocessing
+import re
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import worker
+from .cache import get_analysis, set_analysis, get_engagement, set_engagement, dump_analysis, load_analysis
+from .logs import open_log
+from .models import AnalysisJob
+from .render_server import render
+from .storage import load_chart, store_chart
+
+# size of the process pool running the analysis next to the web server,
+# 0 leaves the jobs to separately started `manage.py analyzer_worker` processes
+JOB_WORKERS = getattr(settings, 'ANALYZER_JOB_WORKERS', 2)
+# seconds after which a running job is taken for lost along with its worker, and queued again
+JOB_TIMEOUT = getattr(settings, 'ANALYZER_JOB_TIMEOUT', 15 * 60)
+
+# charts of a single engagement, named after the chart of the whole analysis they are the counterpart of
+ENGAGEMENT_CHART = re.compile(r'engagement-(?P<number>\d+)-(?P<name>\w+)')
+
+_pool = None
+_queued = set()  # ids of the jobs queued in the pool of this process and not finished yet
+
+logger = logging.getLogger(__name__)
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),  # no database connections inherited from the web server
+            initializer=worker.setup
+        )
+    return _pool
+
+
+def discard_pool(pool):
+    """dropping a pool broken by the death of one of its workers, a new one being started for the next jobs"""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False)
+
+
+def job_done(job_id, pool, future):
+    _queued.discard(job_id)
+    error = future.exception()
+    if error is not None:
+        logger.error('analysis job %s failed in the pool', job_id, exc_info=error)
+        if isinstance(error, BrokenProcessPool):
+            discard_pool(pool)
+
+
+def queue(job_id):
+    """queueing the job in the pool of this process, unless it's there already"""
+    if job_id in _queued:
+        return
+    pool = get_pool()
+    try:
+        future = pool.submit(worker.run, job_id)
+    except BrokenProcessPool:
+        logger.warning('analysis pool broken, starting a new one')
+        discard_pool(pool)
+        pool = get_pool()
+        future = pool.submit(worker.run, job_id)
+    _queued.add(job_id)
+    future.add_done_callback(functools.partial(job_done, job_id, pool))
+
+
+def requeue_stale(**filters):
+    """:return: number of the running jobs not finished in JOB_TIMEOUT put back in the queue"""
+    stale = AnalysisJob.objects.filter(
+        status=AnalysisJob.RUNNING, started__lt=timezone.now() - timedelta(seconds=JOB_TIMEOUT), **filters
+    )
+    return stale.update(status=AnalysisJob.PENDING, started=None)
+
+
+def recover(job):
+    """
+    :return: the job, queued again if it's been lost: running for longer than JOB_TIMEOUT, its worker having died,
+    or pending without being queued in the pool of this process, which may have broken since
+    """
+    if job.status == AnalysisJob.RUNNING and requeue_stale(pk=job.pk):
+        job.refresh_from_db()
+    if job.status == AnalysisJob.PENDING and JOB_WORKERS:
+        job_id = str(job.id)
+        transaction.on_commit(lambda: queue(job_id))
+    return job
+
+
+def submit(key, retry=False):
+    """
+    :key: id of the stored log to analyze
+    :retry: queueing a new job if the latest one has failed, as for a log uploaded again
+    :return: the latest job for the log, a new one being queued if the log hasn't been submitted before,
+    see recover for the jobs lost by their worker
+    """
+    job = AnalysisJob.objects.filter(log_hash=key).order_by('-created').first()
+    if job is None or retry and job.status == AnalysisJob.FAILED:
+        job = AnalysisJob.objects.create(log_hash=key)
+    return recover(job)
+
+
+def run_job(job_id):
+    """:return: False if the job is not pending anymore, having been claimed by another worker"""
+    claimed = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.PENDING).update(
+        status=AnalysisJob.RUNNING, started=timezone.now()
+    )
+    if not claimed:
+        return False
+    job = AnalysisJob.objects.get(pk=job_id)
+    from .analyze import Analyzer  # pandas and the plotting stack, imported on the first analysis only
+    try:
+        with open_log(job.log_hash) as log:
+            # charts are rendered on request, and the lines read from the stored log again when shown
+            analyzer = Analyzer(log, lazy=True, keep_lines=False)
+        analysis = {
+            'context': analyzer.context, 'specs': analyzer.chart_specs, 'hits': analyzer.hits, 'stages': analyzer.stages
+        }
+    except Exception:
+        job.status = AnalysisJob.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = AnalysisJob.DONE
+        job.result = dump_analysis(analysis)
+        set_analysis(job.log_hash, **analysis)
+    job.finished = timezone.now()
+    job.save()
+    return True
+
+
+def run_pending():
+    """:return: number of pending jobs run by this process, the stale running ones included"""
+    requeue_stale()
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.PENDING).order_by('created').values_list('pk', flat=True)
+    return sum(run_job(job_id) for job_id in pending)
+
+
+def load_result(job):
+    """:return: dict of 'context', chart 'specs', 'hits' and 'stages' of a successful job, None otherwise"""
+    if job.status != AnalysisJob.DONE:
+        return None
+    return load_analysis(job.result)
+
+
+def find_analysis(key):
+    """:return: analysis of the log from the cache or from its latest successful job, None if there's none"""
+    analysis = get_analysis(key)
+    if analysis is None:
+        job = AnalysisJob.objects.filter(log_hash=key, status=AnalysisJob.DONE).order_by('-created').first()
+        if job is not None:
+            analysis = load_result(job)
+            set_analysis(key, **analysis)
+    return analysis
+
+
+def analyze_engagement(analysis, number):
+    """:return: EngagementAnalyzer of one engagement of the analysis, None for analyses stored without engagements"""
+    hits = analysis.get('hits')
+    if hits is None or 'Engagement' not in hits.columns:
+        return None
+    from .analyze import EngagementAnalyzer
+    return EngagementAnalyzer(hits, [number])
+
+
+def find_engagement(key, number):
+    """
+    :return: dict of 'context' and chart 'specs' of one engagement of the analysis of the log hash, analyzed once
+    and cached for its page and every one of its charts, None if there's no such analysis or it has no engagements
+    """
+    engagement = get_engagement(key, number)
+    if engagement is None:
+        analysis = find_analysis(key)
+        analyzer = analyze_engagement(analysis, number) if analysis is not None else None
+        if analyzer is None:
+            return None
+        engagement = {'context': analyzer.context, 'specs': analyzer.chart_specs}
+        set_engagement(key, number, **engagement)
+    return engagement
+
+
+def get_or_render_chart(key, name):
+    """
+    :name: name of a chart of the analysis, or of the chart of one engagement as engagement-<number>-<chart name>,
+    the engagement being analyzed on the first of its requests
+    :return: png bytes of the chart, rendered on the first request and memoized, None for unknown charts
+    """
+    image = load_chart(key, name)
+    if image is None:
+        engagement = ENGAGEMENT_CHART.fullmatch(name)
+        if engagement is not None:
+            analysis, chart_name = find_engagement(key, int(engagement['number'])), engagement['name']
+        else:
+            analysis, chart_name = find_analysis(key), name
+        if analysis is None:
+            return None
+        specs = analysis['specs']
+        if chart_name not in specs:
+            return None
+        chart, kwargs = specs[chart_name]
+        image = render(chart, kwargs)
+        store_chart(key, name, image)
+    return image
@@ -0,0 +1,141 @@
+"""
+Live analysis of a gamelog still being written: appended chunks are parsed as they arrive
+and folded into running aggregates, so that updating the summary costs time proportional to the new lines only.
+The state of each live analysis is kept in the analysis cache between the chunks, which must be shared by the
+processes serving the site, and its updates are serialized by a lock kept in that cache too.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+
+from .analyze import hits_frame, roll_up, stats_table
+from .cache import CACHE_ALIAS
+from .gamelog import Tokenizer, iter_text_lines, HIT, NEUT, WARP, BOUNTY
+from .logs import LineDecoder
+
+LIVE_TTL = getattr(settings, 'ANALYZER_LIVE_TTL', 60 * 60)  # seconds since the last chunk
+LIVE_LOCK_TIMEOUT = getattr(settings, 'ANALYZER_LIVE_LOCK_TIMEOUT', 30)  # seconds a chunk waits for the previous one
+KEY_PREFIX = 'analyzer:live:'
+LOCK_PREFIX = 'analyzer:live-lock:'
+LOCK_POLL = .05  # seconds between the attempts at taking a lock
+DAMAGE_LEVELS = ['Direction', 'Weapon', 'Entity']
+
+
+class LiveAnalysis:
+
+    def __init__(self):
+        self.decoder = LineDecoder()
+        self.tokenizer = Tokenizer(keep_lines=False)
+        self.line_count = 0
+        # running damage sum, max and count per direction, weapon and entity
+        self.damage = pd.DataFrame(
+            columns=['sum', 'max', 'count'], index=pd.MultiIndex.from_tuples([], names=DAMAGE_LEVELS), dtype='int64'
+        )
+        # entities and weapons per direction in order of appearance, dicts standing for ordered sets
+        self.entities = {'to': {}, 'from': {}}
+        self.weapons = {'to': {}, 'from': {}}
+        self.neuters = {}
+        self.incoming_warp_prevention = {}  # action: ordered set of issuers
+        self.bounty = 0
+
+    def feed(self, chunk, final=False):
+        """:chunk: bytes appended to the log since the previous chunk"""
+        lines = self.decoder.decode(chunk, final)
+        self.line_count += len(lines)
+        events = self.tokenizer.feed(iter_text_lines(lines)).events
+        self.add_hits(hits_frame(events[HIT]))
+        for _, amount, source, target in events[NEUT]:
+            if source == target:
+                self.neuters[target] = max(amount, self.neuters.get(target, 0))
+        for _, action, issuer, recipient in events[WARP]:
+            if recipient == 'you':
+                self.incoming_warp_prevention.setdefault(action, {})[issuer] = None
+        self.bounty += sum(amount for _, amount in events[BOUNTY])
+        for kind_events in events.values():  # only the new lines' events are processed next time
+            kind_events.clear()
+        return self
+
+    def add_hits(self, hits):
+        if hits.empty:
+            return
+        for direction in ('to', 'from'):
+            directed = hits[hits.Direction == direction]
+            self.entities[direction].update(dict.fromkeys(directed.Entity.unique().tolist()))
+            self.weapons[direction].update(dict.fromkeys(directed.Weapon.unique().tolist()))
+        damage = hits.groupby(DAMAGE_LEVELS, observed=True).Damage.agg(['sum', 'max', 'count'])
+        damage.index = pd.MultiIndex.from_tuples(damage.index.tolist(), names=DAMAGE_LEVELS)
+        self.damage = pd.concat([self.damage, damage]).groupby(level=DAMAGE_LEVELS).agg(
+            {'sum': 'sum', 'max': 'max', 'count': 'sum'}
+        )
+
+    def summary(self):
+        """:return: context of the log so far, in the terms of the full analysis plus the running damage stats"""
+        directions = self.damage.index.get_level_values('Direction')
+        return {
+            'processed': True,
+            'line_count': self.line_count,
+            'targets': list(self.entities['to']),
+            'player_weapons': list(self.weapons['to']) or None,
+            'enemies': list(self.entities['from']) or None,
+            'enemy_weapons': list(self.weapons['from']),
+            'incoming_warp_prevention': {
+                action: ', '.join(issuers) for action, issuers in self.incoming_warp_prevention.items()
+            },
+            'neuters': self.neuters,
+            'bounty': self.bounty,
+            'delivered_per_weapon': stats_table(roll_up(self.damage[directions == 'to'], 'Weapon')),
+            'delivered_per_target': stats_table(roll_up(self.damage[directions == 'to'], 'Entity')),
+            'received_per_enemy': stats_table(roll_up(self.damage[directions == 'from'], 'Entity')),
+        }
+
+
+def start_live():
+    """:return: id of a new live analysis"""
+    live_id = uuid.uuid4().hex
+    save_live(live_id, LiveAnalysis())
+    return live_id
+
+
+def load_live(live_id):
+    return caches[CACHE_ALIAS].get(KEY_PREFIX + live_id)
+
+
+def save_live(live_id, analysis):
+    caches[CACHE_ALIAS].set(KEY_PREFIX + live_id, analysis, LIVE_TTL)
+
+
+class LiveBusy(Exception):
+    """the previous chunk of a live analysis is still being folded in"""
+
+
+@contextmanager
+def live_lock(live_id):
+    """
+    held while a chunk is folded into a live analysis, so that concurrent chunks don't each update the state
+    they loaded and overwrite one another; expires after LIVE_LOCK_TIMEOUT should its holder die
+    """
+    cache = caches[CACHE_ALIAS]
+    key, token = LOCK_PREFIX + live_id, uuid.uuid4().hex
+    deadline = time.monotonic() + LIVE_LOCK_TIMEOUT
+    while not cache.add(key, token, LIVE_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise LiveBusy(live_id)
+        time.sleep(LOCK_POLL)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:  # unless it expired and was taken by another request meanwhile
+            cache.delete(key)
+
+
+def feed_live(live_id, chunk, final=False):
+    """:return: the live analysis with the chunk folded in, None if there's no such analysis"""
+    with live_lock(live_id):
+        analysis = load_live(live_id)
+        if analysis is not None:
+            save_live(live_id, analysis.feed(chunk, final))
+    return analysis
@@ -0,0 +1,138 @@
+"""
+Line index of the stored logs, for the log viewer to read any window of lines without decompressing
+the whole log: the gzip stream of a log is fully flushed every BLOCK_LINES lines, so that decompression can
+start afresh at the recorded offset of every block, and the channel of every line is kept for the filtering.
+The index is written next to the log as <hash>.idx while the log is stored, as data only: a JSON header
+of the line count and of the lengths of the arrays, followed by the little-endian arrays themselves.
+"""
+import json
+import sys
+import zlib
+from array import array
+
+from .gamelog import BODY_OFFSET, strip_tags
+
+BLOCK_LINES = 1000
+READ_SIZE = 64 * 1024
+NO_CHANNEL = ''  # lines without a timestamp, such as the header
+INDEX_MAGIC = b'evesight-index 2\n'  # indexes starting otherwise, such as the former pickled ones, are rebuilt
+
+
+def line_channel(line):
+    """:return: channel of a log line, such as 'combat' for '[ 2022.11.01 08:28:39 ] (combat) ...'"""
+    if not line.startswith('[ '):
+        return NO_CHANNEL
+    channel, closed, _ = line[BODY_OFFSET + 1:].partition(')')
+    return channel if closed and line[BODY_OFFSET:BODY_OFFSET + 1] == '(' else NO_CHANNEL
+
+
+def view_line(line):
+    """:return: the line as shown by the viewer, markup-free and with the non-breaking spaces of the tokenizer"""
+    return strip_tags(line.strip().replace('\xa0', '_'))
+
+
+class IndexWriter:
+    """Collects the index of a log while it's being written to a gzip file"""
+
+    def __init__(self, raw, gz):
+        """
+        :raw: the file the gzip stream is written to
+        :gz: the GzipFile writing to raw, its header written already
+        """
+        self.raw, self.gz = raw, gz
+        self.offsets = array('Q', [raw.tell()])  # file offset of the compressed data of every block
+        self.lines = {}  # channel: array of the numbers of its lines
+        self.count = 0
+
+    def add(self, line):
+        """to be called before the line is written"""
+        if self.count and self.count % BLOCK_LINES == 0:
+            self.gz.flush(zlib.Z_FULL_FLUSH)  # the previous block is complete, the next one starting independently
+            self.offsets.append(self.raw.tell())
+        self.lines.setdefault(line_channel(line), array('I')).append(self.count)
+        self.count += 1
+
+    def save(self, path):
+        header = {
+            'count': self.count, 'offsets': len(self.offsets),
+            'channels': [[channel, len(numbers)] for channel, numbers in self.lines.items()],
+        }
+        with open(path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(json.dumps(header).encode() + b'\n')
+            for values in (self.offsets, *self.lines.values()):
+                f.write(little_endian(values).tobytes())
+
+
+def little_endian(values):
+    """:return: the array in the byte order of the index files, the same one if the machine's already"""
+    if sys.byteorder == 'little':
+        return values
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+
+def read_array(f, typecode, length):
+    values = array(typecode)
+    values.fromfile(f, length)
+    return little_endian(values)
+
+
+def load_index(path):
+    """
+    :return: dict of block 'offsets', line numbers per channel in 'lines' and the line 'count',
+    None if missing or written in another format
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                return None
+            header = json.loads(f.readline())
+            offsets = read_array(f, 'Q', header['offsets'])
+            lines = {channel: read_array(f, 'I', length) for channel, length in header['channels']}
+    except FileNotFoundError:
+        return None
+    return {'offsets': offsets, 'lines': lines, 'count': header['count']}
+
+
+def read_block(log, offset):
+    """
+    :log: the gzip file opened in binary mode, read as raw bytes
+    :return: the text lines of the block starting at the offset
+    """
+    log.seek(offset)
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)  # raw deflate, no gzip header at a flush point
+    data = bytearray()
+    while data.count(b'\n') < BLOCK_LINES and not decompressor.eof:
+        chunk = log.read(READ_SIZE)
+        if not chunk:
+            break
+        data += decompressor.decompress(chunk)
+    return data.decode('utf-8', errors='replace').split('\n')[:BLOCK_LINES]
+
+
+def select_lines(index, start, count, channel=None):
+    """
+    :return: numbers of the lines of the window, counting only the lines of the channel if given,
+    along with the total number of lines in the channel
+    """
+    numbers = range(index['count']) if channel is None else index['lines'].get(channel, ())
+    return numbers[start:start + count], len(numbers)
+
+
+def read_lines(log, index, numbers):
+    """:return: list of (number, channel, text) of the lines, reading each block they're in once"""
+    rows = []
+    block, lines = None, []
+    for number in numbers:
+        if number // BLOCK_LINES != block:
+            block = number // BLOCK_LINES
+            lines = read_block(log, index['offsets'][block])
+        line = lines[number % BLOCK_LINES]
+        rows.append((number, line_channel(line), view_line(line)))
+    return rows
+
+
+def channel_counts(index):
+    return {channel: len(numbers) for channel, numbers in index['lines'].items()}
@@ -0,0 +1,177 @@
+"""
+Uploaded gamelogs, decoded chunk by chunk and kept gzip-compressed on disk as LOG_ROOT/<hash>.log.gz,
+with a GameLog row per log. The content hash doubles as the id the session and the analysis jobs
+refer to the log by, so the same log uploaded again is stored once. Logs not used for LOG_TTL seconds expire.
+"""
+import codecs
+import datetime
+import gzip
+import os
+import tempfile
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .logindex import IndexWriter, load_index, select_lines, read_lines, channel_counts
+from .models import GameLog, AnalysisJob
+
+# directory of the stored logs, required: one of the site's own, never a shared temporary one,
+# the logs and their indexes being read back by the web processes
+LOG_ROOT = getattr(settings, 'ANALYZER_LOG_ROOT', None)
+LOG_TTL = getattr(settings, 'ANALYZER_LOG_TTL', 60 * 60 * 24)  # seconds
+LOG_COMPRESS_LEVEL = getattr(settings, 'ANALYZER_LOG_COMPRESS_LEVEL', 6)  # gzip level of the stored logs
+ENCODING = 'utf-8'
+
+
+class LineDecoder:
+    """Incremental decoder of log bytes into text lines, carrying the partial last line over to the next chunk"""
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder(ENCODING)(errors='replace')
+        self.tail = ''
+
+    def decode(self, chunk, final=False):
+        """:return: list of the lines completed by the chunk, each ending with a bare '\n'"""
+        *lines, self.tail = (self.tail + self.decoder.decode(chunk, final)).split('\n')
+        if final and self.tail:
+            lines.append(self.tail)
+            self.tail = ''
+        return [line.rstrip('\r') + '\n' for line in lines]
+
+
+def iter_decoded_lines(chunks):
+    """
+    :chunks: iterable of bytes, such as the chunks of an uploaded file
+    :return: generator of text lines, each ending with a bare '\n', decoded incrementally
+    """
+    decoder = LineDecoder()
+    for chunk in chunks:
+        yield from decoder.decode(chunk)
+    yield from decoder.decode(b'', final=True)
+
+
+def log_root():
+    if not LOG_ROOT:
+        raise ImproperlyConfigured('ANALYZER_LOG_ROOT must be set to a directory of the site')
+    return LOG_ROOT
+
+
+def log_path(log_id):
+    return os.path.join(log_root(), f'{log_id}.log.gz')
+
+
+def index_path(log_id):
+    return os.path.join(log_root(), f'{log_id}.idx')
+
+
+def expiry():
+    return timezone.now() + datetime.timedelta(seconds=LOG_TTL)
+
+
+def write_log(lines, fd, index_file):
+    """
+    writing the lines to the file descriptor gzip-compressed and their index to the index file
+    :return: sha256 digest object of the lines, their size in bytes and whether they look like a gamelog
+    """
+    digest = sha256()
+    size = 0
+    is_gamelog = False
+    with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=LOG_COMPRESS_LEVEL) as f:
+        index = IndexWriter(raw, f)
+        for line in lines:
+            is_gamelog = is_gamelog or 'Gamelog' in line
+            encoded = line.encode(ENCODING)
+            digest.update(encoded)
+            size += len(encoded)
+            index.add(line)
+            f.write(encoded)
+    index.save(index_file)
+    return digest, size, is_gamelog
+
+
+def store_log(chunks):
+    """
+    :chunks: iterable of bytes
+    :return: id of the stored log, None if it doesn't look like a gamelog, in which case nothing is stored
+    """
+    os.makedirs(log_root(), mode=0o700, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=LOG_ROOT, suffix='.tmp')
+    temp_index_path = temp_path + '.idx'
+    try:
+        digest, size, is_gamelog = write_log(iter_decoded_lines(chunks), fd, temp_index_path)
+        if not is_gamelog:
+            return None
+        log_id = digest.hexdigest()
+        stored_size = os.path.getsize(temp_path)
+        # moved into place even for a log stored already, whose files may have been removed since
+        os.replace(temp_index_path, index_path(log_id))
+        os.replace(temp_path, log_path(log_id))
+        if GameLog.objects.filter(pk=log_id).update(expires=expiry()):
+            return log_id
+        try:
+            GameLog.objects.create(id=log_id, size=size, stored_size=stored_size, expires=expiry())
+        except IntegrityError:  # stored concurrently
+            pass
+        return log_id
+    finally:
+        for path in (temp_path, temp_index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def touch_log(log_id):
+    """:return: True if the log is still stored, its expiry being postponed"""
+    return bool(GameLog.objects.filter(pk=log_id, expires__gt=timezone.now()).update(expires=expiry()))
+
+
+def open_log(log_id):
+    """:return: text file of the stored log, to be iterated over line by line"""
+    return gzip.open(log_path(log_id), 'rt', encoding=ENCODING)
+
+
+def reindex_log(log_id):
+    """rewriting a log stored before the logs were indexed, or indexed in a former format, along with its index"""
+    fd, temp_path = tempfile.mkstemp(dir=log_root(), suffix='.tmp')
+    temp_index_path = temp_path + '.idx'
+    try:
+        with open_log(log_id) as log:
+            write_log(log, fd, temp_index_path)
+        os.replace(temp_index_path, index_path(log_id))
+        os.replace(temp_path, log_path(log_id))
+    finally:
+        for path in (temp_path, temp_index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def read_window(log_id, start, count, channel=None):
+    """
+    :start, count: window of the lines, counting only the lines of the channel if given
+    :return: dict of the window 'lines' as (number, channel, markup-free text), the 'total' number of lines
+    in the channel and the line count of every channel in 'channels'
+    """
+    index = load_index(index_path(log_id))
+    if index is None:  # missing or outdated
+        reindex_log(log_id)
+        index = load_index(index_path(log_id))
+    numbers, total = select_lines(index, start, count, channel)
+    with open(log_path(log_id), 'rb') as log:
+        lines = read_lines(log, index, numbers)
+    return {'lines': lines, 'total': total, 'channels': channel_counts(index)}
+
+
+def purge_expired_logs():
+    """:return: number of expired logs removed along with their analysis jobs"""
+    expired = list(GameLog.objects.filter(expires__lte=timezone.now()).values_list('pk', flat=True))
+    for log_id in expired:
+        for path in (log_path(log_id), index_path(log_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    AnalysisJob.objects.filter(log_hash__in=expired).delete()
+    GameLog.objects.filter(pk__in=expired).delete()
+    return len(expired)
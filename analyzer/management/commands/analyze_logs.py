@@ -0,0 +1,37 @@
+import json
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.analyze import render_charts
+from analyzer.batch import BatchAnalyzer
+from analyzer.export import summary_context
+
+
+class Command(BaseCommand):
+    help = 'Analyzes all the gamelogs of a directory as one data set, writing the summary and the charts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--pattern', default='*.txt', help='file name pattern of the logs')
+        parser.add_argument('--workers', type=int, default=None, help='parsing processes, one per CPU by default')
+        parser.add_argument('--output', default='.', help='directory receiving context.json and the chart pngs')
+
+    def handle(self, *args, **options):
+        paths = sorted(Path(options['directory']).glob(options['pattern']))
+        if not paths:
+            raise CommandError(f"No {options['pattern']} files in {options['directory']}")
+        analyzer = BatchAnalyzer(paths, workers=options['workers'])
+        output = Path(options['output'])
+        os.makedirs(output, exist_ok=True)
+        with open(output / 'context.json', 'w') as f:
+            json.dump(summary_context(analyzer.context), f, indent=2, default=str)
+        images = render_charts(analyzer.chart_specs)  # written to the output only, no Plot row being saved
+        for name, image in images.items():
+            with open(output / f'{name}.png', 'wb') as f:
+                f.write(image)
+        self.stdout.write(
+            f'Analyzed {len(paths)} logs with {len(analyzer.hits)} hits, '
+            f'{len(images)} charts written to {output}'
+        )
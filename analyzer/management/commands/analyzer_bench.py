@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from analyzer.bench import run_benchmark, compare
+
+
+class Command(BaseCommand):
+    help = 'Times every analysis stage on synthetic gamelogs of the given sizes, saving the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1000, 10000, 100000], help='log sizes')
+        parser.add_argument('--enemies', type=int, default=8, help='kinds of enemies in the logs')
+        parser.add_argument('--player-weapons', type=int, default=4)
+        parser.add_argument('--enemy-weapons', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=3, help='timed runs per size, the fastest one counting')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run for peak memory')
+        parser.add_argument('--output', default='bench.json', help='file receiving the results')
+        parser.add_argument('--compare', help='results of a previous run to compare the stage times with')
+
+    def handle(self, *args, **options):
+        results = run_benchmark(
+            options['lines'], options['enemies'], options['player_weapons'], options['enemy_weapons'],
+            options['repeat'], options['seed'], trace_memory=not options['no_memory']
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        for run in results['runs']:
+            self.stdout.write(
+                f"{run['lines']} lines, {run['bytes'] / 2 ** 20:.1f} MB: {run['total_seconds']:.3f} s, "
+                f"{run['lines_per_second']:.0f} lines/s, {run['mb_per_second']:.2f} MB/s overall, "
+                f"{run['parse_lines_per_second']:.0f} lines/s parsing"
+                + (f", peak {run['peak_bytes'] / 2 ** 20:.1f} MB" if run['peak_bytes'] is not None else '')
+            )
+            for name, stage in run['stages'].items():
+                peak = f"  {stage['peak_bytes'] / 2 ** 20:8.2f} MB" if stage['peak_bytes'] is not None else ''
+                self.stdout.write(f"    {name:40} {stage['seconds']:9.4f} s{peak}")
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write('Compared with ' + str(previous['meta'].get('revision')))
+            for lines, name, before, after in compare(results, previous):
+                self.stdout.write(f'    {lines:>8} {name:40} {before:9.4f} s -> {after:9.4f} s  x{after / before:.2f}')
+        self.stdout.write(f"Results saved to {options['output']}")
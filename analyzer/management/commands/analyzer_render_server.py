@@ -0,0 +1,27 @@
+import signal
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.render_server import RENDER_SOCKET, RENDER_PROCESSES, RenderServer
+
+
+class Command(BaseCommand):
+    help = 'Serves the chart rendering of the web and job processes over a Unix socket, with the plotting stack warm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=RENDER_SOCKET, help='socket path, ANALYZER_RENDER_SOCKET by default')
+        parser.add_argument(
+            '--processes', type=int, default=RENDER_PROCESSES, help='renderers, each rendering a chart at a time'
+        )
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('No socket path: set ANALYZER_RENDER_SOCKET or pass --socket')
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # removing the socket on the way out
+        with RenderServer(options['socket']) as server:
+            self.stdout.write(f"Rendering charts on {options['socket']} with {options['processes']} renderers")
+            try:
+                server.serve_pool(options['processes'])
+            except KeyboardInterrupt:
+                pass
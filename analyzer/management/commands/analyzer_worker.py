@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analyzer.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Runs queued log analysis jobs, polling the database for new ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            done = run_pending()
+            if done:
+                self.stdout.write(f'Analyzed {done} log(s)')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
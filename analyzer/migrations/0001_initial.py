@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Plot',
+            fields=[
+                ('session_id', models.CharField(max_length=128, primary_key=True, serialize=False)),
+                ('data', models.TextField(default='')),
+                ('weapon_performance_per_hit', models.BinaryField(null=True)),
+                ('weapon_performance_totals', models.BinaryField(null=True)),
+                ('mean_delivered', models.BinaryField()),
+                ('top_delivered', models.BinaryField()),
+                ('incoming_per_hit', models.BinaryField(null=True)),
+                ('incoming_totals', models.BinaryField(null=True)),
+                ('mean_received', models.BinaryField()),
+                ('top_received', models.BinaryField()),
+                ('total_received', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0002_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameLog',
+            fields=[
+                ('id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('stored_size', models.PositiveBigIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='plot',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0003_gamelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='dps_delivered',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='plot',
+            name='dps_received',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='plot',
+            name='neut_pressure',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -1,10 +1,11 @@
+import uuid
+
 from django.db import models
 
 
 # Create your models here.
 class Plot(models.Model):
     session_id = models.CharField(max_length=128, primary_key=True)
-    data = models.TextField(default='')
     weapon_performance_per_hit = models.BinaryField(null=True)
     weapon_performance_totals = models.BinaryField(null=True)
     mean_delivered = models.BinaryField()
@@ -14,3 +15,40 @@ class Plot(models.Model):
     mean_received = models.BinaryField()
     top_received = models.BinaryField()
     total_received = models.BinaryField()
+    dps_delivered = models.BinaryField(null=True)
+    dps_received = models.BinaryField(null=True)
+    neut_pressure = models.BinaryField(null=True)
+
+
+class GameLog(models.Model):
+    id = models.CharField(max_length=64, primary_key=True)  # sha256 of the decoded log
+    size = models.PositiveBigIntegerField()  # decoded log bytes
+    stored_size = models.PositiveBigIntegerField()  # compressed bytes on disk
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.id
+
+
+class AnalysisJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    log_hash = models.CharField(max_length=64, db_index=True)  # id of the stored log to analyze
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    result = models.BinaryField(null=True)  # analysis dict as made by cache.dump_analysis
+    error = models.TextField(default='')
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
@@ -0,0 +1,141 @@
+"""
+Chart rendering by a long-lived local server: `manage.py analyzer_render_server` imports and warms up the plotting
+stack once, then forks ANALYZER_RENDER_PROCESSES renderers that share it, each taking the charts sent to the Unix
+socket ANALYZER_RENDER_SOCKET one at a time. With the socket configured, the web and job processes send it their
+chart specs rather than rendering them, and render in place whenever no renderer takes the chart within
+ANALYZER_RENDER_QUEUE_TIMEOUT, the server being down or busy.
+Messages are pickles prefixed with their length, so the socket is made accessible to its owner only.
+"""
+import logging
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import struct
+
+from django.conf import settings
+
+# path of the socket of the render server, None rendering the charts in the requesting process
+RENDER_SOCKET = getattr(settings, 'ANALYZER_RENDER_SOCKET', None)
+RENDER_PROCESSES = getattr(settings, 'ANALYZER_RENDER_PROCESSES', os.cpu_count() or 1)  # renderers of the server
+# seconds waited for a renderer to take the chart before rendering it in place, and for the rendered chart
+RENDER_QUEUE_TIMEOUT = getattr(settings, 'ANALYZER_RENDER_QUEUE_TIMEOUT', 1)
+RENDER_TIMEOUT = getattr(settings, 'ANALYZER_RENDER_TIMEOUT', 60)
+HEADER = struct.Struct('!Q')
+READY = b'+'  # sent by the renderer taking a request, before the chart spec is sent to it
+
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    """the render server failed to render the chart"""
+
+
+def send_message(sock, message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def receive_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError('render connection closed')
+        data += chunk
+    return bytes(data)
+
+
+def receive_message(sock):
+    size, = HEADER.unpack(receive_exactly(sock, HEADER.size))
+    return pickle.loads(receive_exactly(sock, size))
+
+
+def request_render(path, chart, kwargs):
+    """:return: png bytes of the chart rendered by the server listening on the socket path"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(RENDER_QUEUE_TIMEOUT)
+        sock.connect(path)
+        receive_exactly(sock, len(READY))
+        sock.settimeout(RENDER_TIMEOUT)
+        send_message(sock, (chart.__name__, kwargs))
+        status, result = receive_message(sock)
+    if status != 'ok':
+        raise RenderError(result)
+    return result
+
+
+def render(chart, kwargs):
+    """:return: png bytes of the chart, rendered by the render server when configured and reachable"""
+    if RENDER_SOCKET:
+        try:
+            return request_render(RENDER_SOCKET, chart, kwargs)
+        except OSError as e:  # not running, or all its renderers busy
+            logger.warning('render server unreachable, rendering %s in place: %s', chart.__name__, e)
+    return chart(**kwargs)
+
+
+class RenderHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            self.request.sendall(READY)
+            name, kwargs = receive_message(self.request)
+        except (OSError, pickle.UnpicklingError, struct.error):  # the client gave up waiting, rendering in place
+            return
+        try:
+            result = 'ok', self.server.renderers[name](**kwargs)
+        except Exception as e:
+            logger.exception('failed rendering %s', name)
+            result = 'error', f'{type(e).__name__}: {e}'
+        send_message(self.request, result)
+
+
+class RenderServer(socketserver.UnixStreamServer):
+    """Renders one chart at a time, matplotlib not being thread safe, see serve_pool for more"""
+
+    def __init__(self, path):
+        from . import charts
+        from .warmup import warm_up
+        warm_up()
+        self.renderers = {
+            chart.__name__: chart for chart in (charts.bar_pair, charts.pie_pair, charts.damage_grid, charts.timeline)
+        }
+        if os.path.exists(path):  # left over by a previous server
+            os.remove(path)
+        umask = os.umask(0o177)  # the socket created accessible to its owner only
+        try:
+            super().__init__(path, RenderHandler)
+        finally:
+            os.umask(umask)
+
+    def serve_pool(self, processes=RENDER_PROCESSES):
+        """
+        serving the socket from the given number of renderers forked from this warmed up process, each accepting
+        the next connection once done with a chart, the others waiting in the listen queue meanwhile;
+        renderers that die are replaced, and all of them terminated along with this process
+        """
+        renderers = set()
+        try:
+            while True:
+                while len(renderers) < processes:
+                    pid = os.fork()
+                    if pid == 0:
+                        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                        try:
+                            self.serve_forever()
+                        finally:
+                            os._exit(1)  # never back to the caller of the server
+                    renderers.add(pid)
+                pid, _ = os.wait()
+                renderers.discard(pid)
+        finally:
+            for pid in renderers:
+                os.kill(pid, signal.SIGTERM)
+            for pid in renderers:
+                os.waitpid(pid, 0)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
@@ -0,0 +1,65 @@
+"""
+Local uploader for the live analysis: follows a gamelog as EVE appends to it
+and posts the new bytes to the analyzer, printing the updated summary.
+
+usage: python tail_gamelog.py <gamelog path> [--server http://localhost:8000] [--interval 2]
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+
+CHUNK_SIZE = 1024 * 1024  # bytes posted at most at once, below the request size limit of the server
+
+
+def post(url, data=b''):
+    """:return: the JSON response, an HTTPError being raised for a response other than 2xx"""
+    request = urllib.request.Request(
+        url, data=data, method='POST', headers={'Content-Type': 'application/octet-stream'}
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def error_message(error):
+    try:
+        return json.load(error)['error']
+    except (ValueError, KeyError, TypeError):
+        return error.reason
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feed a growing gamelog to the analyzer live mode')
+    parser.add_argument('path')
+    parser.add_argument('--server', default='http://localhost:8000')
+    parser.add_argument('--interval', type=float, default=2, help='seconds between the checks for new lines')
+    args = parser.parse_args()
+
+    url = args.server.rstrip('/') + post(args.server.rstrip('/') + '/analyzer/live/')['url']
+    print('live analysis at', url)
+    chunk = b''
+    with open(args.path, 'rb') as log:
+        try:
+            while True:
+                chunk = chunk or log.read(CHUNK_SIZE)
+                if not chunk:
+                    time.sleep(args.interval)
+                    continue
+                try:
+                    summary = post(url, chunk)
+                except urllib.error.HTTPError as error:
+                    if error.code < 500:  # such as the live analysis having expired, posting again won't help
+                        sys.exit(f'{error.code}: {error_message(error)}')
+                    print(f'{error.code}: {error_message(error)}, retrying', file=sys.stderr)
+                    time.sleep(args.interval)  # the same chunk being posted again
+                    continue
+                chunk = b''
+                print(json.dumps({key: summary[key] for key in ('line_count', 'bounty', 'neuters')}))
+        except KeyboardInterrupt:
+            post(url + '?final=1', chunk)
+
+
+if __name__ == '__main__':
+    main()
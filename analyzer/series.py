@@ -0,0 +1,86 @@
+"""
+Chart data for drawing in the browser: the series each chart spec would be rendered from,
+reduced to labels, values and colors in plain JSON types, so that the server does no plotting at all.
+Colors are resolved here with the same matplotlib colormaps, for both modes to look alike.
+"""
+import numpy as np
+from django.conf import settings
+from matplotlib import colormaps
+from matplotlib.colors import Normalize, to_hex
+
+from . import charts
+
+# 'server' rendering png images, or 'client' sending the series for the browser to draw, unless ?charts= says otherwise
+CHART_MODE = getattr(settings, 'ANALYZER_CHART_MODE', 'server')
+GRID_RADII = (4, 12)  # pixels, marker radius range of the damage grids, after the seaborn sizes (50, 250)
+
+
+def labels(index):
+    return [str(value) for value in index]
+
+
+def sampled_colors(cmap, count):
+    """:return: hex colors evenly sampled along the colormap, as pandas picks them for the pie wedges"""
+    return [to_hex(color) for color in colormaps[cmap](np.linspace(0, 1, count))]
+
+
+def bar_pair(left, right, titles, color, **kwargs):
+    return {
+        'type': 'bars', 'titles': list(titles), 'color': to_hex(color),
+        'labels': labels(left.index), 'left': left.round(1).tolist(), 'right': right.round(1).tolist(),
+    }
+
+
+def pie_pair(left, right, titles, cmap, **kwargs):
+    return {
+        'type': 'pies', 'titles': list(titles),
+        'pies': [
+            {'labels': labels(series.index), 'values': series.tolist(), 'colors': sampled_colors(cmap, len(series)),
+             'total': int(series.sum())}
+            for series in (left, right)
+        ],
+    }
+
+
+def damage_grid(data, palette, title, **kwargs):
+    points = data.reset_index()
+    norm = Normalize(points.Damage.min(), points.Damage.max())
+    scaled = norm(points.Damage.to_numpy(dtype=float)).filled(0)  # a single damage value scales to 0
+    low, high = GRID_RADII
+    return {
+        'type': 'grid', 'title': title,
+        'weapons': labels(points.Weapon.unique()), 'entities': labels(points.Entity.unique()),
+        'points': [
+            {'x': entity, 'y': weapon, 'r': round(low + (high - low) * size, 1), 'damage': int(damage), 'color': color}
+            for entity, weapon, damage, size, color in zip(
+                labels(points.Entity), labels(points.Weapon), points.Damage, scaled,
+                (to_hex(color) for color in colormaps[palette](scaled)),
+            )
+        ],
+    }
+
+
+def timeline(data, title, ylabel, cmap, **kwargs):
+    colors = colormaps[cmap].resampled(max(len(data.columns), 2))  # as pandas picks the line colors
+    return {
+        'type': 'lines', 'title': title, 'ylabel': ylabel,
+        'labels': data.index.strftime('%H:%M:%S').tolist(),
+        'lines': [
+            {'label': str(name), 'values': data[name].round(1).tolist(), 'color': to_hex(colors(i))}
+            for i, name in enumerate(data.columns)
+        ],
+    }
+
+
+# chart renderer: its series counterpart
+SERIES = {
+    charts.bar_pair: bar_pair, charts.pie_pair: pie_pair, charts.damage_grid: damage_grid, charts.timeline: timeline
+}
+
+
+def chart_series(specs):
+    """
+    :specs: dict of chart name: (chart function, keyword arguments), as prepared by the Analyzer
+    :return: dict of chart name: JSON-ready series of the chart
+    """
+    return {name: SERIES[chart](**kwargs) for name, (chart, kwargs) in specs.items()}
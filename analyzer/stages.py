@@ -0,0 +1,88 @@
+"""
+Instrumentation of the analysis stages: the wall time, the CPU time and, while tracemalloc is tracing,
+the allocation delta of every decorated Analyzer method, collected in analyzer.stages.
+When an analysis is over, its stage records are passed on to the configured hooks,
+and the views report them in a Server-Timing header for the browser developer tools.
+"""
+import contextlib
+import functools
+import logging
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# dotted paths of the callables receiving (analyzer, stage records) after every analysis
+STAGE_HOOKS = getattr(settings, 'ANALYZER_STAGE_HOOKS', ['analyzer.stages.log_stages'])
+# tracing the allocations slows the analysis down, so it's only done when asked for
+TRACE_MEMORY = getattr(settings, 'ANALYZER_TRACE_MEMORY', False)
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def record(stages, name):
+    """
+    :stages: dict receiving the record of the stage under its name:
+    {'wall': seconds, 'cpu': seconds, 'alloc': bytes or None when not tracing}
+    """
+    tracing = tracemalloc.is_tracing()
+    allocated = tracemalloc.get_traced_memory()[0] if tracing else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        stages[name] = {
+            'wall': time.perf_counter() - wall,
+            'cpu': time.process_time() - cpu,
+            'alloc': tracemalloc.get_traced_memory()[0] - allocated if tracing else None,
+        }
+
+
+def stage(method):
+    """decorator of the Analyzer methods recording their stage"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with record(self.stages, method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+@functools.cache
+def get_hooks():
+    return [import_string(path) for path in STAGE_HOOKS]
+
+
+def instrumented(run):
+    """decorator of the whole analysis, tracing the allocations if configured to and calling the hooks once done"""
+    run = stage(run)
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        trace = TRACE_MEMORY and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        try:
+            result = run(self, *args, **kwargs)
+        finally:
+            if trace:
+                tracemalloc.stop()
+        for hook in get_hooks():
+            hook(self, self.stages)
+        return result
+    return wrapper
+
+
+def log_stages(analyzer, stages):
+    logger.info('analysis stages: %s', ', '.join(
+        f"{name} {record['wall'] * 1000:.1f} ms" for name, record in stages.items()
+    ))
+
+
+def server_timing(stages):
+    """:return: Server-Timing header value of the stages, wall times in ms with the CPU times as descriptions"""
+    return ', '.join(
+        f"{name};dur={record['wall'] * 1000:.1f};desc=\"cpu {record['cpu'] * 1000:.1f} ms\""
+        for name, record in stages.items()
+    )
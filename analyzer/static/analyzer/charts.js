@@ -0,0 +1,100 @@
+// Drawing the analysis charts in the browser out of the series embedded in the page as JSON,
+// with the vendored Chart.js, in place of the server rendered pngs
+(function () {
+    'use strict';
+
+    const series = JSON.parse(document.getElementById('chart-series').textContent);
+
+    function canvasIn(container, className) {
+        const box = document.createElement('div');
+        box.className = className;
+        const canvas = document.createElement('canvas');
+        box.appendChild(canvas);
+        container.appendChild(box);
+        return canvas;
+    }
+
+    function title(text) {
+        return {display: true, text: text};
+    }
+
+    function drawBars(container, data) {
+        [data.left, data.right].forEach((values, i) => {
+            new Chart(canvasIn(container, 'chart-half'), {
+                type: 'bar',
+                data: {labels: data.labels, datasets: [{data: values, backgroundColor: data.color + 'd9'}]},
+                options: {plugins: {title: title(data.titles[i]), legend: {display: false}}},
+            });
+        });
+    }
+
+    function drawPies(container, data) {
+        data.pies.forEach((pie, i) => {
+            new Chart(canvasIn(container, 'chart-half'), {
+                type: 'pie',
+                data: {labels: pie.labels, datasets: [{data: pie.values, backgroundColor: pie.colors}]},
+                options: {
+                    plugins: {
+                        title: title(data.titles[i]),
+                        subtitle: {display: true, position: 'bottom', text: 'Total: ' + pie.total},
+                        legend: {position: 'right'},
+                    },
+                },
+            });
+        });
+    }
+
+    function drawGrid(container, data) {
+        new Chart(canvasIn(container, 'chart-full'), {
+            type: 'bubble',
+            data: {
+                datasets: [{
+                    data: data.points,
+                    backgroundColor: data.points.map(point => point.color),
+                    borderColor: 'gray',
+                    borderWidth: 1,
+                }],
+            },
+            options: {
+                scales: {
+                    x: {type: 'category', labels: data.entities, offset: true, ticks: {autoSkip: false}},
+                    y: {type: 'category', labels: data.weapons, offset: true},
+                },
+                plugins: {
+                    title: title(data.title),
+                    legend: {display: false},
+                    tooltip: {
+                        callbacks: {label: context => context.raw.y + ' on ' + context.raw.x + ': ' + context.raw.damage},
+                    },
+                },
+            },
+        });
+    }
+
+    function drawLines(container, data) {
+        new Chart(canvasIn(container, 'chart-full'), {
+            type: 'line',
+            data: {
+                labels: data.labels,
+                datasets: data.lines.map(line => ({
+                    label: line.label, data: line.values, borderColor: line.color, backgroundColor: line.color,
+                    borderWidth: 1.2, pointRadius: 0,
+                })),
+            },
+            options: {
+                interaction: {mode: 'index', intersect: false},
+                scales: {y: {title: {display: true, text: data.ylabel}}},
+                plugins: {title: title(data.title), legend: {position: 'right'}},
+            },
+        });
+    }
+
+    const draw = {bars: drawBars, pies: drawPies, grid: drawGrid, lines: drawLines};
+
+    document.querySelectorAll('.client-chart').forEach(container => {
+        const data = series[container.dataset.chart];
+        if (data) {
+            draw[data.type](container, data);
+        }
+    });
+})();
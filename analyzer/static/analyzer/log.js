@@ -0,0 +1,91 @@
+// Reading the stored log a window at a time from the log_lines view, when the log is opened
+// and then whenever more lines are asked for, optionally only the lines of one channel; changing the channel
+// aborts the window being fetched for the previous one
+(function () {
+    'use strict';
+
+    const details = document.querySelector('details.log');
+    const lines = details.querySelector('.log-lines');
+    const more = details.querySelector('.log-more');
+    const channel = details.querySelector('.log-channel');
+    const error = details.querySelector('.log-error');
+    let next = 0;
+    let request = null;  // AbortController of the window being fetched
+
+    function fillChannels(counts) {
+        if (channel.options.length > 1) {
+            return;
+        }
+        Object.keys(counts).filter(name => name).sort().forEach(name => {
+            channel.add(new Option(name + ' (' + counts[name] + ')', name));
+        });
+    }
+
+    function readPage(response) {
+        return response.json().catch(() => ({})).then(page => {
+            if (!response.ok) {
+                throw new Error(page.error || response.status + ' ' + response.statusText);
+            }
+            return page;
+        });
+    }
+
+    function load() {
+        if (request || next === null) {
+            return;
+        }
+        const current = request = new AbortController();
+        const params = new URLSearchParams({from: next});
+        if (channel.value) {
+            params.set('channel', channel.value);
+        }
+        error.hidden = true;
+        fetch(lines.dataset.url + '?' + params, {signal: current.signal})
+            .then(readPage)
+            .then(page => {
+                if (current.signal.aborted) {  // read before the channel changed
+                    return;
+                }
+                fillChannels(page.channels);
+                page.lines.forEach(([, , text]) => {
+                    lines.appendChild(document.createTextNode(text));
+                    lines.appendChild(document.createElement('br'));
+                });
+                next = page.next;
+                more.hidden = next === null;
+            })
+            .catch(reason => {
+                if (!current.signal.aborted) {
+                    error.textContent = 'The log could not be read: ' + reason.message;
+                    error.hidden = false;
+                    more.hidden = false;  // to try again
+                }
+            })
+            .finally(() => {
+                if (request === current) {
+                    request = null;
+                }
+            });
+    }
+
+    details.addEventListener('toggle', () => {
+        if (details.open && next === 0 && !lines.hasChildNodes()) {
+            load();
+        }
+    });
+    more.addEventListener('click', load);
+    lines.addEventListener('scroll', () => {
+        if (lines.scrollTop + lines.clientHeight >= lines.scrollHeight - 50) {
+            load();
+        }
+    });
+    channel.addEventListener('change', () => {
+        if (request) {
+            request.abort();
+            request = null;
+        }
+        lines.replaceChildren();
+        next = 0;
+        load();
+    });
+})();
@@ -0,0 +1,128 @@
+"""
+Rendered charts kept on disk per analysis, so that concurrent analyses never share files.
+Charts of an analysis live in CHART_ROOT/<id[:2]>/<id>/<name>.png and are removed by a background
+collector once the analysis directory hasn't been written to for CHART_TTL seconds,
+the same collector removing the expired logs.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+
+from .logs import purge_expired_logs
+
+CHART_ROOT = getattr(settings, 'ANALYZER_CHART_ROOT', None)  # required, a directory of the site's own like LOG_ROOT
+CHART_TTL = getattr(settings, 'ANALYZER_CHART_TTL', 60 * 60 * 24)  # seconds
+GC_INTERVAL = getattr(settings, 'ANALYZER_CHART_GC_INTERVAL', 60 * 15)  # seconds
+FILE_REFERENCE = b'file:'  # prefix of the chart references kept in database rows instead of the pngs
+
+_collector = None
+_collector_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def chart_root():
+    if not CHART_ROOT:
+        raise ImproperlyConfigured('ANALYZER_CHART_ROOT must be set to a directory of the site')
+    return CHART_ROOT
+
+
+def analysis_dir(analysis_id):
+    return os.path.join(chart_root(), analysis_id[:2], analysis_id)
+
+
+def chart_path(analysis_id, name):
+    return os.path.join(analysis_dir(analysis_id), f'{name}.png')
+
+
+def load_chart(analysis_id, name):
+    """:return: png bytes of the stored chart, or None"""
+    start_collector()
+    try:
+        with open(chart_path(analysis_id, name), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def store_chart(analysis_id, name, image):
+    start_collector()
+    directory = analysis_dir(analysis_id)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')  # readers never see a half written chart
+    with os.fdopen(fd, 'wb') as f:
+        f.write(image)
+    os.replace(temp_path, chart_path(analysis_id, name))
+
+
+def store_reference(analysis_id, name, image):
+    """:return: reference to the chart stored in place of the png, for a database row to keep"""
+    store_chart(analysis_id, name, image)
+    return FILE_REFERENCE + f'{analysis_id}/{name}'.encode()
+
+
+def load_blob(blob):
+    """:return: png bytes of a chart kept either as such or as a reference made by store_reference, None if expired"""
+    blob = bytes(blob)
+    if not blob.startswith(FILE_REFERENCE):
+        return blob
+    analysis_id, name = blob[len(FILE_REFERENCE):].decode().split('/')
+    return load_chart(analysis_id, name)
+
+
+def purge_expired(now=None):
+    """
+    :return: number of analyses whose charts were removed for having expired, the directories removed meanwhile
+    by the collector of another process being skipped
+    """
+    deadline = (now or time.time()) - CHART_TTL
+    removed = 0
+    try:
+        with os.scandir(chart_root()) as entries:
+            shards = [shard.path for shard in entries]
+    except FileNotFoundError:
+        return removed
+    for shard in shards:
+        try:
+            with os.scandir(shard) as analyses:
+                for entry in analyses:
+                    try:
+                        expired = entry.stat().st_mtime < deadline
+                    except FileNotFoundError:
+                        continue
+                    if expired:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def collect():
+    while True:
+        time.sleep(GC_INTERVAL)
+        try:
+            purge_expired()
+            purge_expired_logs()
+        except Exception:  # the next pass trying again rather than the thread dying for the life of the process
+            logger.exception('chart and log collection failed')
+        finally:
+            close_old_connections()
+
+
+def start_collector():
+    """starting the garbage collecting thread of this process, once"""
+    global _collector
+    if _collector is not None:
+        return
+    with _collector_lock:
+        if _collector is None:
+            _collector = threading.Thread(target=collect, name='analyzer-chart-collector', daemon=True)
+            _collector.start()
@@ -0,0 +1,101 @@
+"""
+Synthetic gamelogs for the benchmarks: combat sessions of any length against a configurable mix
+of enemies and weapons, written line by line in the formats of the real logs.
+"""
+import datetime
+import random
+
+from .gamelog import TIME_FORMAT
+
+SEPARATOR = '-' * 60
+START = datetime.datetime(2022, 11, 1, 8, 0, 0)
+HIT_TOKENS = ('Grazes', 'Hits', 'Glances Off', 'Smashes', 'Penetrates', 'Wrecks')
+
+# line kind: share of the log, roughly after the combat sessions of the example log
+KIND_WEIGHTS = {
+    'hit_to': 45, 'hit_from': 30, 'miss_to': 6, 'miss_from': 6, 'neut': 4, 'warp': 3, 'bounty': 2, 'notify': 4,
+}
+
+
+def player_weapon_names(count):
+    return [f'Synthetic Heavy Missile {i}' for i in range(count)]
+
+
+def enemy_weapon_names(count):
+    return [f'Synthetic Rocket {i}' for i in range(count)]
+
+
+def enemy_names(count):
+    return [f'Synthetic Enemy {i:02d}' for i in range(count)]
+
+
+def generate_lines(line_count, enemies=8, player_weapons=4, enemy_weapons=4, seed=0):
+    """
+    :line_count: number of lines of the log, header included
+    :enemies: number of kinds of enemies, every one shooting back and some of them neuting and scrambling
+    :player_weapons, enemy_weapons: number of kinds of weapons on each side, enemies also hitting with no weapon shown
+    :seed: of the random choices, the same arguments always producing the same log
+    :return: generator of the log lines, without line separators
+    """
+    rng = random.Random(seed)
+    enemy_list = enemy_names(enemies)
+    weapon_list = player_weapon_names(player_weapons)
+    enemy_weapon_list = enemy_weapon_names(enemy_weapons) + [None]
+    kinds, weights = zip(*KIND_WEIGHTS.items())
+    time = START
+    header = [SEPARATOR, 'Gamelog', 'Listener: Synthetic', f'Session Started: {START.strftime(TIME_FORMAT)}', SEPARATOR]
+    yield from header[:line_count]
+    for _ in range(line_count - len(header)):
+        time += datetime.timedelta(seconds=rng.choice((0, 0, 1, 1, 2)))
+        enemy = rng.choice(enemy_list)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'hit_to':
+            body = (
+                f'<color=0xff00ffff><b>{rng.randint(20, 1400)}</b> <color=0x77ffffff><font size=10>to</font>'
+                f' <b><color=0xffffffff>{enemy}</b><font size=10><color=0x77ffffff>'
+                f' - {rng.choice(weapon_list)} - {rng.choice(HIT_TOKENS)}'
+            )
+        elif kind == 'hit_from':
+            weapon = rng.choice(enemy_weapon_list)
+            body = (
+                f'<color=0xffcc0000><b>{rng.randint(5, 500)}</b> <color=0x77ffffff><font size=10>from</font>'
+                f' <b><color=0xffffffff>{enemy}</b><font size=10><color=0x77ffffff>'
+                f'{f" - {weapon}" if weapon else ""} - {rng.choice(HIT_TOKENS)}'
+            )
+        elif kind == 'miss_to':
+            weapon = rng.choice(weapon_list)
+            body = f'Your {weapon} misses {enemy} completely - {weapon}'
+        elif kind == 'miss_from':
+            body = f'{enemy} misses you completely'
+        elif kind == 'neut':
+            body = (
+                f'<color=0xffe57f7f><b>{rng.randint(1, 120)} GJ</b><color=0x77ffffff><font size=10>'
+                f' energy neutralized </font><b><color=0xffffffff>{enemy}</b><color=0x77ffffff>'
+                f'<font size=10> - {enemy}</font>'
+            )
+        elif kind == 'warp':
+            body = (
+                f'<color=0xffffffff><b>Warp {rng.choice(("disruption", "scramble"))} attempt</b>'
+                f' <color=0x77ffffff><font size=10>from</font> <color=0xffffffff><b>{enemy}</b>'
+                f' <color=0x77ffffff><font size=10>to <b><color=0xffffffff></font>you!'
+            )
+        elif kind == 'bounty':
+            yield (
+                f'[ {time.strftime(TIME_FORMAT)} ] (bounty) <font size=12><b>{rng.randint(10, 999)}\xa0'
+                f'{rng.randint(0, 999):03d} ISK</b> added to next bounty payout'
+            )
+            continue
+        else:
+            yield f'[ {time.strftime(TIME_FORMAT)} ] (notify) Synthetic notification'
+            continue
+        yield f'[ {time.strftime(TIME_FORMAT)} ] (combat) {body}'
+
+
+def log_bytes(lines):
+    """:return: the log file as written by the game"""
+    return '\r\n'.join(lines).encode('utf-8')
+
+
+def escaped_log(lines):
+    """:return: the log in the escaped form of the former uploads, the repr of the file bytes"""
+    return str(log_bytes(lines))[2:-1]
@@ -1,3 +1,894 @@
-from django.test import TestCase
+import codecs
+import io
+import os
+import pickle
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .analyze import (
+    Analyzer, EngagementAnalyzer, hits_frame, render_charts, aggregate_damage, roll_up, stats_table, rate_timeline,
+    thin_timeline, peak_rates, engagement_numbers, engagement_stats, engagement_table, lump_tail, OTHER,
+    TIMELINE_WINDOW, covered_seconds,
+)
+from . import charts
+from .export import encode_hits
+from .series import chart_series
+from .render_server import RenderError, request_render, render, READY
+from .stages import server_timing
+from .bench import run_benchmark, compare, PARSE_STAGES, SUMMARY_STAGES, PLOT_STAGES
+from .synthetic import generate_lines, escaped_log, log_bytes
+from .batch import parse_log_file, merge_hits
+from .checks import check_storage_roots, check_shared_cache
+from .cache import get_analysis, set_analysis, dump_analysis, load_analysis, CACHE_ALIAS, ENGAGEMENT_PREFIX
+from .gamelog import Tokenizer, iter_escaped_lines, iter_text_lines, HIT, MISS, NEUT, WARP, BOUNTY
+from .live import LiveAnalysis, live_lock
+from .jobs import submit, run_job, run_pending, load_result, get_or_render_chart, queue, JOB_TIMEOUT
+from . import jobs
+from .logindex import BLOCK_LINES, load_index, view_line
+from .logs import (
+    store_log, open_log, touch_log, purge_expired_logs, iter_decoded_lines, log_path, index_path, read_window, LOG_TTL,
+)
+from .models import AnalysisJob, GameLog, Plot
+from .storage import load_chart, store_chart, purge_expired, collect, load_blob, CHART_TTL
+
+SAMPLE_LOG = (
+    '------------------------------------------------------------\\r\\n'
+    'Gamelog\\r\\n'
+    '[ 2022.11.01 08:28:39 ] (combat) Tetrimon Heretic misses you completely\\r\\n'
+    '[ 2022.11.01 08:28:47 ] (combat) <color=0xffe57f7f><b>2 GJ</b><color=0x77ffffff><font size=10>'
+    ' energy neutralized </font><b><color=0xffffffff>Tetrimon Crucifier</b><color=0x77ffffff>'
+    '<font size=10> - Tetrimon Crucifier</font>\\r\\n'
+    '[ 2022.11.01 08:28:47 ] (combat) <color=0xffcc0000><b>67</b> <color=0x77ffffff><font size=10>from</font>'
+    ' <b><color=0xffffffff>Tetrimon Crucifier</b><font size=10><color=0x77ffffff> - Wrecks\\r\\n'
+    '[ 2022.11.01 08:28:48 ] (combat) <b>Warp disruption attempt</b> <font size=10>from</font>'
+    ' <b>Tetrimon Crucifier</b> <font size=10>to <b></font>you!\\r\\n'
+    '[ 2022.11.01 08:28:50 ] (combat) <color=0xff00ffff><b>312</b> <color=0x77ffffff><font size=10>to</font>'
+    ' <b><color=0xffffffff>Tetrimon Oracle</b><font size=10><color=0x77ffffff> - Inferno Heavy Missile - Hits\\r\\n'
+    '[ 2022.11.01 08:29:30 ] (bounty) <font size=12><b>12\\xc2\\xa0345 ISK</b> added to next bounty payout\\r\\n'
+    '[ 2022.11.01 08:29:31 ] (notify) Nothing to see here\\r\\n'
+)
+SAMPLE_FILE = codecs.escape_decode(SAMPLE_LOG)[0]  # the log as uploaded
+SECOND_FIGHT = (  # ten minutes after the sample
+    b'[ 2022.11.01 08:40:00 ] (combat) <b>100</b> <font size=10>to</font> <b>Tetrimon Oracle</b><font size=10>'
+    b' - Inferno Heavy Missile - Hits\r\n'
+)
+
+
+class TempStorageMixin:
+    """pointing the log and chart stores at a directory of the test, removed after it"""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        for target, name in (('analyzer.logs.LOG_ROOT', 'logs'), ('analyzer.storage.CHART_ROOT', 'charts')):
+            patcher = mock.patch(target, os.path.join(root, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TokenizerTests(SimpleTestCase):
+    def setUp(self):
+        self.tokenizer = Tokenizer().feed(iter_escaped_lines(SAMPLE_LOG))
+
+    def test_lines_are_kept_without_markup(self):
+        self.assertEqual(len(self.tokenizer.lines), 10)
+        self.assertFalse(any('<' in line for line in self.tokenizer.lines))
+
+    def test_events_are_sorted_by_kind(self):
+        events = self.tokenizer.events
+        self.assertEqual(events[HIT], [
+            ('2022.11.01 08:28:47', '67 from Tetrimon Crucifier - Wrecks'),
+            ('2022.11.01 08:28:50', '312 to Tetrimon Oracle - Inferno Heavy Missile - Hits'),
+        ])
+        self.assertEqual(events[MISS], [('2022.11.01 08:28:39', 'Tetrimon Heretic misses you completely')])
+        self.assertEqual(events[NEUT], [('2022.11.01 08:28:47', 2, 'Tetrimon Crucifier', 'Tetrimon Crucifier')])
+        self.assertEqual(events[WARP], [('2022.11.01 08:28:48', 'Warp disruption', 'Tetrimon Crucifier', 'you')])
+        self.assertEqual(events[BOUNTY], [('2022.11.01 08:29:30', 12345)])
+
+    def test_lines_can_be_skipped(self):
+        tokenizer = Tokenizer(keep_lines=False).feed(iter_escaped_lines(SAMPLE_LOG))
+        self.assertIsNone(tokenizer.lines)
+        self.assertEqual(tokenizer.events, self.tokenizer.events)
+
+
+class HitsFrameTests(SimpleTestCase):
+    def test_hits_are_extracted_into_typed_columns(self):
+        hits = hits_frame(Tokenizer().feed(iter_escaped_lines(SAMPLE_LOG)).events[HIT])
+        self.assertEqual(hits.columns.tolist(), ['Time', 'Damage', 'Direction', 'Entity', 'Weapon', 'Token'])
+        self.assertEqual(hits.Damage.dtype, 'int32')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(hits.Time))
+        self.assertEqual(hits.Entity.dtype, 'category')
+        self.assertEqual(hits.Damage.tolist(), [67, 312])
+        self.assertEqual(hits.Direction.tolist(), ['from', 'to'])
+        self.assertEqual(hits.Weapon.tolist(), ['Unknown', 'Inferno Heavy Missile'])
+        self.assertEqual(hits.Token.tolist(), ['Wrecks', 'Hits'])
+
+    def test_irregular_hits_are_matched_by_pattern(self):
+        hits = hits_frame([
+            ('2022.11.01 08:28:39', '120 from Angel - Arch Gistum - Heavy Missile - Hits'),  # separator in the name
+            ('2022.11.01 08:28:40', '45 to Angel Cartel - Glances Off'),
+            ('2022.11.01 08:28:41', 'Many to Angel - Hits'),
+        ])
+        self.assertEqual(hits.Entity.tolist(), ['Angel', 'Angel Cartel'])
+        self.assertEqual(hits.Weapon.tolist(), ['Arch Gistum - Heavy Missile', 'Unknown'])
+        self.assertEqual(hits.Token.tolist(), ['Hits', 'Glances Off'])
+
+    def test_no_hits(self):
+        self.assertTrue(hits_frame([]).empty)
+
+    @mock.patch('analyzer.analyze.HIT_BATCH', 1)
+    def test_hits_are_parsed_in_batches(self):
+        self.assertTrue(Analyzer(SAMPLE_LOG, lazy=True).hits.drop(columns='Engagement').equals(hits_frame(
+            Tokenizer().feed(iter_escaped_lines(SAMPLE_LOG)).events[HIT]
+        )))
+
+
+class AggregateTests(SimpleTestCase):
+    def test_stats_are_rolled_up_from_weapon_entity_pairs(self):
+        hits = pd.DataFrame({
+            'Weapon': ['Drone', 'Drone', 'Drone', 'Missile'],
+            'Entity': ['Oracle', 'Oracle', 'Curse', 'Oracle'],
+            'Damage': [10, 30, 50, 100],
+        }).astype({'Weapon': 'category', 'Entity': 'category'})
+        pairs = aggregate_damage(hits)
+        self.assertEqual(pairs.columns.tolist(), ['mean', 'max', 'sum', 'count'])
+        self.assertEqual(pairs.loc[('Drone', 'Oracle'), 'mean'], 20)
+        self.assertEqual(stats_table(roll_up(pairs, 'Weapon')), {
+            'Drone': {'mean': 30.0, 'max': 50, 'sum': 90, 'count': 3},
+            'Missile': {'mean': 100.0, 'max': 100, 'sum': 100, 'count': 1},
+        })
+        self.assertEqual(
+            stats_table(roll_up(pairs, 'Entity'))['Oracle'], {'mean': 46.7, 'max': 100, 'sum': 140, 'count': 3}
+        )
+
+    def test_long_tails_are_lumped(self):
+        hits = pd.DataFrame({
+            'Weapon': ['Drone', 'Drone', 'Drone', 'Missile', 'Laser', 'Laser'],
+            'Entity': ['Oracle', 'Oracle', 'Curse', 'Oracle', 'Curse', 'Oracle'],
+            'Damage': [10, 30, 50, 100, 1, 3],
+        }).astype({'Weapon': 'category', 'Entity': 'category'})
+        pairs = aggregate_damage(hits)
+        per_weapon = roll_up(pairs, 'Weapon')
+        self.assertIs(lump_tail(per_weapon, {'Weapon': 3}), per_weapon)
+        self.assertEqual(stats_table(lump_tail(per_weapon, {'Weapon': 2})), {
+            'Missile': {'mean': 100.0, 'max': 100, 'sum': 100, 'count': 1},
+            OTHER: {'mean': 18.8, 'max': 50, 'sum': 94, 'count': 5},  # drones and lasers
+        })
+        lumped = lump_tail(pairs, {'Weapon': 2, 'Entity': 5})
+        self.assertEqual(lumped.index.tolist(), [('Missile', 'Oracle'), (OTHER, 'Curse'), (OTHER, 'Oracle')])
+        self.assertEqual(lumped.loc[(OTHER, 'Oracle'), 'sum'], 43)
+
+
+class TimelineTests(SimpleTestCase):
+    def test_rates_match_pandas_rolling_windows(self):
+        times = pd.Timestamp('2022-11-01 08:28:39') + pd.to_timedelta([0, 0, 3, 12, 12, 40, 41], unit='s')
+        hits = pd.DataFrame({
+            'Time': times,
+            'Weapon': pd.Categorical(['Drone', 'Missile', 'Drone', 'Drone', 'Missile', 'Drone', 'Drone']),
+            'Damage': [10, 300, 20, 40, 200, 5, 7],
+        })
+        timeline = rate_timeline(hits, 'Damage', 'Weapon', window=5)
+        self.assertEqual(len(timeline), 22)  # the seconds within the window of a hit, 9-11 and 18-39 left out
+        dense = thin_timeline(timeline)
+        self.assertEqual(len(dense), 47)  # until the window has passed the last hit
+        expected = (
+            hits.groupby(['Time', 'Weapon'], observed=True).Damage.sum().unstack(fill_value=0)
+            .reindex(dense.index, fill_value=0).rolling('5s').sum() / 5
+        )
+        self.assertEqual(timeline.iloc[-1].tolist(), [0, 0])
+        expected.columns = expected.columns.astype(str)
+        pd.testing.assert_frame_equal(dense, expected.astype(float), check_names=False, check_freq=False)
+        pd.testing.assert_frame_equal(timeline, expected.loc[timeline.index].astype(float), check_names=False,
+                                      check_freq=False)
+        self.assertEqual(peak_rates(timeline), {'Drone': 8.0, 'Missile': 60.0, 'Total': 66.0})
+        thinned = thin_timeline(timeline, points=10)
+        self.assertEqual(thinned.index.freqstr, '5s')
+        self.assertEqual(thinned.Missile.iloc[0], 300 * 5 / 5 / 5)  # one window of 60 averaged over a bin of 5 s
+        lumped = rate_timeline(hits.assign(Weapon=hits.Weapon.cat.add_categories('Laser')), 'Damage', 'Weapon',
+                               window=5, top=1)
+        self.assertEqual(lumped.columns.tolist(), [OTHER])
+        self.assertEqual(lumped[OTHER].tolist(), timeline.sum(axis=1).tolist())
+        self.assertTrue(rate_timeline(hits.iloc[:0], 'Damage', 'Weapon').empty)
+        self.assertEqual(peak_rates(rate_timeline(hits.iloc[:0], 'Damage', 'Weapon')), {})
+
+    def test_covered_seconds_are_the_union_of_the_windows(self):
+        occupied = np.array([0, 3, 12, 13, 40])
+        expected = np.unique((occupied[:, None] + np.arange(6)).ravel())
+        np.testing.assert_array_equal(covered_seconds(occupied, 5), expected)
+        np.testing.assert_array_equal(covered_seconds(np.array([7]), 2), [7, 8, 9])
+
+    def test_timelines_spanning_days(self):
+        rng = np.random.default_rng(0)
+        times = pd.Timestamp('2022-11-01 08:00:00') + pd.to_timedelta(
+            np.sort(rng.integers(0, 3 * 24 * 3600, 200)), unit='s'
+        )
+        hits = pd.DataFrame({
+            'Time': times, 'Entity': pd.Categorical(rng.integers(0, 50, 200).astype(str)),
+            'Damage': rng.integers(1, 500, 200),
+        })
+        timeline = rate_timeline(hits, 'Damage', 'Entity', top=12)
+        self.assertLessEqual(len(timeline), 200 * (TIMELINE_WINDOW + 1))  # not a row for every second of the days
+        self.assertEqual(len(timeline.columns), 12)
+        self.assertEqual(timeline.columns[-1], OTHER)
+        self.assertAlmostEqual(timeline.to_numpy().sum(), hits.Damage.sum())  # every hit rated over its window
+        thinned = thin_timeline(timeline, points=600)
+        self.assertLessEqual(len(thinned), 600)
+        width = (thinned.index[1] - thinned.index[0]).total_seconds()
+        self.assertAlmostEqual(thinned.to_numpy().sum() * width, hits.Damage.sum())
+
+    def test_analysis_timelines(self):
+        analyzer = Analyzer(SAMPLE_LOG, lazy=True)
+        self.assertEqual(analyzer.context['peak_dps_delivered'], {'Inferno Heavy Missile': 31.2, 'Total': 31.2})
+        self.assertEqual(analyzer.context['peak_neut_pressure'], {'Tetrimon Crucifier': 0.2, 'Total': 0.2})
+        self.assertEqual(analyzer.context['neuters'], {'Tetrimon Crucifier': 2})
+        self.assertIn('neut_timeline', analyzer.chart_specs)
+        series = chart_series({'neut_timeline': analyzer.chart_specs['neut_timeline']})['neut_timeline']
+        self.assertEqual(series['lines'][0]['label'], 'Tetrimon Crucifier')
+        self.assertEqual(series['labels'][0], '08:28:47')
+        self.assertTrue(render_charts({'neut_timeline': analyzer.chart_specs['neut_timeline']})['neut_timeline']
+                        .startswith(b'\x89PNG'))
+
+
+class EngagementTests(TempStorageMixin, TestCase):
+    def test_engagements_are_split_by_pauses_and_entity_changes(self):
+        hits = pd.DataFrame({
+            'Time': pd.Timestamp('2022-11-01 08:00:00') + pd.to_timedelta([0, 20, 60, 100, 300, 310], unit='s'),
+            'Direction': pd.Categorical(['to', 'from', 'to', 'to', 'to', 'from']),
+            'Entity': pd.Categorical(['Oracle', 'Oracle', 'Oracle', 'Curse', 'Curse', 'Curse']),
+            'Damage': [10, 20, 30, 40, 50, 60],
+        })
+        # 40 seconds on the same entity go on, 40 seconds then another entity and 200 seconds start anew
+        hits['Engagement'] = engagement_numbers(hits, gap=120, switch_gap=30)
+        self.assertEqual(hits.Engagement.tolist(), [1, 1, 1, 2, 3, 3])
+        table = engagement_table(engagement_stats(hits))
+        self.assertEqual(table[0], {
+            'number': 1, 'start': '08:00:00', 'end': '08:01:00', 'seconds': 60,
+            'delivered_damage': 40, 'delivered_hits': 2, 'delivered_entities': 1,
+            'received_damage': 20, 'received_hits': 1, 'received_entities': 1,
+        })
+        self.assertEqual((table[1]['received_damage'], table[1]['seconds']), (0, 0))
+
+    def test_engagement_is_analyzed_from_the_hits(self):
+        analyzer = Analyzer(io.StringIO((SAMPLE_FILE + SECOND_FIGHT).decode()), lazy=True)
+        self.assertEqual([fight['delivered_damage'] for fight in analyzer.context['engagements']], [312, 100])
+        fight = EngagementAnalyzer(analyzer.hits, [2])
+        self.assertEqual(fight.context['delivered_per_weapon']['Inferno Heavy Missile']['sum'], 100)
+        self.assertIsNone(fight.context['enemies'])
+        self.assertIn('mean_delivered', fight.chart_specs)
+
+    @mock.patch('analyzer.jobs.JOB_WORKERS', 0)
+    def test_engagement_page_and_charts(self):
+        session = self.client.session
+        session['log'] = store_log([SAMPLE_FILE + SECOND_FIGHT])
+        session.save()
+        run_job(submit(session['log']).pk)
+        url = reverse('analyzer:engagement', args=[session['log'], 2])
+        self.assertContains(self.client.get(reverse('analyzer:output')), url)
+        response = self.client.get(url)
+        self.assertContains(response, 'Fight 2: 08:40:00 to 08:40:00')
+        self.assertContains(response, 'engagement-2-mean_delivered.png')
+        self.assertNotContains(response, 'engagement-2-total_received.png')  # nothing received in that fight
+        chart = self.client.get(reverse('analyzer:chart', args=[session['log'], 'engagement-2-mean_delivered']))
+        self.assertTrue(chart.content.startswith(b'\x89PNG'))
+        self.assertContains(self.client.get(url, {'charts': 'client'}), '"engagement-2-mean_delivered"')
+        self.assertEqual(self.client.get(reverse('analyzer:engagement', args=[session['log'], 3])).status_code, 404)
+        chart = self.client.get(reverse('analyzer:chart', args=[session['log'], 'engagement-3-mean_delivered']))
+        self.assertEqual(chart.status_code, 404)
+
+    @mock.patch('analyzer.jobs.JOB_WORKERS', 0)
+    def test_engagement_is_analyzed_once_for_its_page_and_charts(self):
+        log_id = store_log([SAMPLE_FILE + SECOND_FIGHT])
+        run_job(submit(log_id).pk)
+        caches[CACHE_ALIAS].delete(f'{ENGAGEMENT_PREFIX}{log_id}:2')
+        with mock.patch('analyzer.analyze.EngagementAnalyzer', wraps=EngagementAnalyzer) as analyzer:
+            for _ in range(2):
+                self.assertEqual(self.client.get(reverse('analyzer:engagement', args=[log_id, 2])).status_code, 200)
+            for name in ('engagement-2-mean_delivered', 'engagement-2-top_delivered'):
+                self.assertEqual(self.client.get(reverse('analyzer:chart', args=[log_id, name])).status_code, 200)
+        analyzer.assert_called_once()
+
+
+class LogStoreTests(TempStorageMixin, TestCase):
+    def test_lines_are_decoded_across_chunks(self):
+        chunks = [SAMPLE_FILE[i:i + 7] for i in range(0, len(SAMPLE_FILE), 7)]
+        self.assertEqual(list(iter_decoded_lines(chunks)), list(iter_decoded_lines([SAMPLE_FILE])))
+        self.assertEqual(list(iter_decoded_lines([b'a\r\nb\xc2\xa0', b'c'])), ['a\n', 'b\xa0c\n'])
+
+    def test_log_is_stored_by_content(self):
+        log_id = store_log([SAMPLE_FILE])
+        self.assertEqual(store_log([SAMPLE_FILE.replace(b'\r\n', b'\n')]), log_id)
+        self.assertNotEqual(store_log([SAMPLE_FILE.replace(b'312', b'313')]), log_id)
+        with open_log(log_id) as log:
+            self.assertEqual(Tokenizer().feed(iter_text_lines(log)).events,
+                             Tokenizer().feed(iter_escaped_lines(SAMPLE_LOG)).events)
+
+    def test_missing_files_are_restored_on_upload(self):
+        log_id = store_log([SAMPLE_FILE])
+        os.remove(log_path(log_id))
+        os.remove(index_path(log_id))
+        self.assertEqual(store_log([SAMPLE_FILE]), log_id)
+        self.assertEqual(read_window(log_id, 0, 2)['lines'], [(0, '', '-' * 60), (1, '', 'Gamelog')])
+        self.assertEqual(GameLog.objects.count(), 1)
+
+    def test_storage_roots_are_required(self):
+        self.assertEqual(check_storage_roots(None), [])
+        with mock.patch('analyzer.logs.LOG_ROOT', None), mock.patch('analyzer.storage.CHART_ROOT', ''):
+            self.assertEqual([error.id for error in check_storage_roots(None)], ['analyzer.E001', 'analyzer.E002'])
+            with self.assertRaises(ImproperlyConfigured):
+                store_log([SAMPLE_FILE])
+        with mock.patch('analyzer.storage.CHART_ROOT', None):
+            self.assertEqual([error.id for error in check_storage_roots(None)], ['analyzer.E002'])
+
+    def test_log_is_stored_compressed(self):
+        log = GameLog.objects.get(pk=store_log([SAMPLE_FILE * 20]))
+        self.assertEqual(log.size, len(SAMPLE_FILE.replace(b'\r\n', b'\n')) * 20)
+        self.assertLess(log.stored_size, log.size)
+
+    def test_not_a_gamelog(self):
+        self.assertIsNone(store_log([b'Dear diary,\r\n']))
+        self.assertFalse(GameLog.objects.exists())
+
+    def test_expired_logs_are_purged(self):
+        log_id = store_log([SAMPLE_FILE])
+        self.assertTrue(touch_log(log_id))
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=LOG_TTL + 1)):
+            self.assertFalse(touch_log(log_id))
+            self.assertEqual(purge_expired_logs(), 1)
+        self.assertFalse(GameLog.objects.filter(pk=log_id).exists())
+        self.assertFalse(os.path.exists(log_path(log_id)))
+        self.assertFalse(os.path.exists(index_path(log_id)))
+
+    def test_log_windows_are_read_by_index(self):
+        log_id = store_log([log_bytes(generate_lines(BLOCK_LINES * 2 + 10))])
+        with open_log(log_id) as log:
+            lines = [view_line(line) for line in log]
+        window = read_window(log_id, BLOCK_LINES - 5, 10)  # across blocks
+        self.assertEqual(window['total'], len(lines))
+        self.assertEqual([text for number, channel, text in window['lines']], lines[BLOCK_LINES - 5:BLOCK_LINES + 5])
+        self.assertEqual(read_window(log_id, len(lines) - 1, 10)['lines'][0][2], lines[-1])
+        self.assertEqual(read_window(log_id, len(lines), 10)['lines'], [])
+        window = read_window(log_id, 0, len(lines), channel='combat')
+        self.assertEqual(window['total'], window['channels']['combat'])
+        self.assertEqual(window['lines'], [(number, 'combat', lines[number]) for number, _, _ in window['lines']])
+        self.assertEqual([text for _, _, text in window['lines']], [line for line in lines if '(combat)' in line])
+
+    def test_logs_stored_without_index_are_indexed(self):
+        log_id = store_log([SAMPLE_FILE])
+        os.remove(index_path(log_id))
+        self.assertEqual(read_window(log_id, 0, 2)['lines'], [(0, '', '-' * 60), (1, '', 'Gamelog')])
+        self.assertTrue(os.path.exists(index_path(log_id)))
+
+    def test_pickled_indexes_are_rebuilt_without_being_loaded(self):
+        log_id = store_log([SAMPLE_FILE])
+        with open(index_path(log_id), 'wb') as f:
+            pickle.dump({'offsets': [], 'lines': {}, 'count': 0}, f)
+        with mock.patch('pickle.load') as load, mock.patch('pickle.loads') as loads:
+            self.assertEqual(read_window(log_id, 0, 2)['total'], 9)
+        load.assert_not_called()
+        loads.assert_not_called()
+        self.assertEqual(load_index(index_path(log_id))['count'], 9)
+
+    @mock.patch('analyzer.views._example_id', None)
+    def test_example_log_is_stored_once(self):
+        with mock.patch('analyzer.views.store_log', wraps=store_log) as store:
+            for _ in range(2):
+                self.assertEqual(self.client.get(reverse('analyzer:example')).status_code, 302)
+            store.assert_called_once()
+            example_id = self.client.session['log']
+            self.assertTrue(GameLog.objects.filter(pk=example_id).exists())
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=LOG_TTL + 1)):
+                purge_expired_logs()
+            self.client.get(reverse('analyzer:example'))
+            self.assertEqual(store.call_count, 2)
+        self.assertEqual(self.client.session['log'], example_id)
+        self.assertTrue(os.path.exists(log_path(example_id)))
+
+    def test_log_lines_of_the_session(self):
+        self.assertEqual(self.client.get(reverse('analyzer:log_lines')).status_code, 404)
+        session = self.client.session
+        session['log'] = store_log([SAMPLE_FILE])
+        session.save()
+        page = self.client.get(reverse('analyzer:log_lines'), {'channel': 'notify'}).json()
+        self.assertEqual(page['lines'], [[8, 'notify', '[ 2022.11.01 08:29:31 ] (notify) Nothing to see here']])
+        self.assertEqual(page['channels'], {'': 2, 'combat': 5, 'bounty': 1, 'notify': 1})
+        page = self.client.get(reverse('analyzer:log_lines'), {'from': 3, 'count': 2}).json()
+        self.assertEqual([number for number, _, _ in page['lines']], [3, 4])
+        self.assertEqual(page['next'], 5)
+        self.assertEqual(self.client.get(reverse('analyzer:log_lines'), {'from': 'x'}).status_code, 400)
+
+
+class AnalysisCacheTests(SimpleTestCase):
+    def test_analysis_round_trip(self):
+        key = 'a' * 64
+        specs = {'bars': (charts.bar_pair, {'color': 'darkred'})}
+        self.assertTrue(set_analysis(key, {'bounty': 12345}, specs))
+        self.assertEqual(
+            get_analysis(key), {'context': {'bounty': 12345}, 'specs': specs, 'hits': None, 'stages': None}
+        )
+        self.assertIsNone(get_analysis('0' * 64))
+
+    def test_analysis_is_stored_compressed(self):
+        analysis = {'context': {'lines': ['the same line'] * 1000}}
+        blob = dump_analysis(analysis)
+        self.assertLess(len(blob), 1000)
+        self.assertEqual(load_analysis(memoryview(blob)), analysis)
+        self.assertEqual(load_analysis(pickle.dumps(analysis, pickle.HIGHEST_PROTOCOL)), analysis)  # stored before
+
+
+@mock.patch('analyzer.jobs.JOB_WORKERS', 0)
+class AnalysisJobTests(TempStorageMixin, TestCase):
+    def test_job_is_queued_once_per_log(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        self.assertEqual(job.status, AnalysisJob.PENDING)
+        self.assertEqual(submit(store_log([SAMPLE_FILE])), job)
+
+    def test_job_is_run_once(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        self.assertTrue(run_job(job.pk))
+        self.assertFalse(run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.DONE)
+        self.assertEqual(load_result(job)['context']['bounty'], 12345)
+        self.assertNotIn('lines', load_result(job)['context'])
+
+    def test_charts_are_rendered_on_request(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        run_job(job.pk)
+        response = self.client.get(reverse('analyzer:chart', args=[job.log_hash, 'mean_delivered']))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(get_or_render_chart(job.log_hash, 'mean_delivered'), response.content)
+        response = self.client.get(reverse('analyzer:chart', args=[job.log_hash, 'no_such_chart']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_charts_are_revalidated_by_etag(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        run_job(job.pk)
+        url = reverse('analyzer:chart', args=[job.log_hash, 'mean_delivered'])
+        response = self.client.get(url)
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_charts_can_be_drawn_client_side(self):
+        session = self.client.session
+        session['log'] = store_log([SAMPLE_FILE])
+        session.save()
+        run_job(submit(session['log']).pk)
+        response = self.client.get(reverse('analyzer:output'), {'charts': 'client'})
+        self.assertContains(response, 'id="chart-series"')
+        self.assertContains(response, reverse('analyzer:log_lines'))  # the log read by the viewer
+        self.assertContains(response, 'data-chart="mean_delivered"')
+        self.assertNotContains(response, '.png')
+        self.assertContains(self.client.get(reverse('analyzer:output')), 'mean_delivered.png')
+
+    def test_job_status(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        response = self.client.get(reverse('analyzer:job_status', args=[job.pk]))
+        self.assertEqual(response.json()['status'], AnalysisJob.PENDING)
+        self.assertFalse(response.json()['finished'])
+
+    def test_stale_running_job_is_queued_again(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        started = timezone.now() - timedelta(seconds=JOB_TIMEOUT + 1)
+        AnalysisJob.objects.filter(pk=job.pk).update(status=AnalysisJob.RUNNING, started=started)
+        response = self.client.get(reverse('analyzer:job_status', args=[job.pk]))
+        self.assertEqual(response.json()['status'], AnalysisJob.PENDING)
+        AnalysisJob.objects.filter(pk=job.pk).update(status=AnalysisJob.RUNNING, started=started)
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.DONE)
+
+    def test_running_job_is_left_alone(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        AnalysisJob.objects.filter(pk=job.pk).update(status=AnalysisJob.RUNNING, started=timezone.now())
+        self.assertEqual(submit(job.log_hash).status, AnalysisJob.RUNNING)
+        self.assertEqual(run_pending(), 0)
+
+    def test_failed_job_is_retried_on_upload(self):
+        job = submit(store_log([SAMPLE_FILE]))
+        AnalysisJob.objects.filter(pk=job.pk).update(status=AnalysisJob.FAILED)
+        self.assertEqual(submit(job.log_hash), job)  # shown as failed rather than retried on every page view
+        self.client.post(reverse('analyzer:upload'), {'file': SimpleUploadedFile('log.txt', SAMPLE_FILE)})
+        retry = submit(job.log_hash)
+        self.assertNotEqual(retry, job)
+        self.assertEqual(retry.status, AnalysisJob.PENDING)
+
+
+class JobPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, jobs, '_pool', None)
+        self.addCleanup(jobs._queued.clear)
+
+    @mock.patch('analyzer.jobs.ProcessPoolExecutor')
+    def test_broken_pool_is_replaced(self, executor):
+        broken, fresh = mock.Mock(), mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool('a worker died')
+        future = Future()
+        fresh.submit.return_value = future
+        executor.side_effect = [broken, fresh]
+        with self.assertLogs('analyzer.jobs', 'WARNING'):
+            queue('job')
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.assertIs(jobs._pool, fresh)
+        queue('job')  # queued already
+        self.assertEqual(fresh.submit.call_count, 1)
+        with self.assertLogs('analyzer.jobs', 'ERROR'):
+            future.set_exception(BrokenProcessPool('a worker died'))
+        self.assertIsNone(jobs._pool)
+        self.assertNotIn('job', jobs._queued)
+
+
+@mock.patch('analyzer.jobs.JOB_WORKERS', 0)
+class ExportTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = submit(store_log([SAMPLE_FILE]))
+        run_job(self.job.pk)
+
+    def test_summary_json(self):
+        summary = self.client.get(reverse('analyzer:export_summary', args=[self.job.log_hash])).json()
+        self.assertEqual(summary['bounty'], 12345)
+        self.assertEqual(summary['received_per_enemy']['Tetrimon Crucifier']['max'], 67)
+        self.assertNotIn('lines', summary)
+
+    @skipIf(find_spec('pyarrow') is None, 'pyarrow is not installed')
+    def test_hits_are_exported_in_columnar_formats(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        response = self.client.get(reverse('analyzer:export_hits', args=[self.job.log_hash, 'arrow']))
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.file')
+        table = pa.ipc.open_file(pa.py_buffer(response.content)).read_all()
+        self.assertEqual(table.column('Damage').to_pylist(), [67, 312])
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('Entity').type))
+        response = self.client.get(reverse('analyzer:export_hits', args=[self.job.log_hash, 'parquet']))
+        self.assertEqual(pq.read_table(io.BytesIO(response.content)).column('Weapon').to_pylist(),
+                         ['Unknown', 'Inferno Heavy Missile'])
+
+    def test_unknown_exports(self):
+        response = self.client.get(reverse('analyzer:export_hits', args=[self.job.log_hash, 'csv']))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('analyzer:export_summary', args=['0' * 64]))
+        self.assertEqual(response.status_code, 404)
+        with self.assertRaises(ValueError):
+            encode_hits(hits_frame([]), 'csv')
+
+
+class ChartSeriesTests(SimpleTestCase):
+    def test_specs_are_turned_into_json_series(self):
+        means = pd.Series([20.5, 100.0], index=['Drone', 'Missile'])
+        scores = pd.DataFrame(
+            {'Damage': [10, 30]}, index=pd.MultiIndex.from_tuples([('Drone', 'Oracle'), ('Missile', 'Curse')],
+                                                                   names=['Weapon', 'Entity'])
+        )
+        series = chart_series({
+            'bars': (charts.bar_pair, {'left': means, 'right': means, 'titles': ('a', 'b'), 'color': 'darkred',
+                                       'figsize': (10, 3)}),
+            'pies': (charts.pie_pair, {'left': means, 'right': means, 'titles': ('a', 'b'), 'cmap': 'Reds_r',
+                                       'figsize': (10, 3), 'radius': .7}),
+            'grid': (charts.damage_grid, {'data': scores, 'palette': 'Reds', 'title': 'c'}),
+        })
+        self.assertEqual(series['bars']['color'], '#8b0000')
+        self.assertEqual(series['bars']['left'], [20.5, 100.0])
+        self.assertEqual(series['pies']['pies'][0]['total'], 120)
+        self.assertEqual(len(series['pies']['pies'][0]['colors']), 2)
+        self.assertEqual(series['grid']['points'][0], {'x': 'Oracle', 'y': 'Drone', 'r': 4.0, 'damage': 10,
+                                                       'color': series['grid']['points'][0]['color']})
+        self.assertEqual(series['grid']['points'][1]['r'], 12.0)
+
+
+class RenderChartsTests(SimpleTestCase):
+    def test_charts_are_rendered_to_png(self):
+        series = pd.Series([300, 120], index=['Inferno Heavy Missile', 'Federation Navy Hobgoblin'])
+        images = render_charts({
+            'bars': (charts.bar_pair, {'left': series, 'right': series, 'titles': ('Mean', 'Top'),
+                                       'color': 'darkorange', 'figsize': (10, 3.5)}),
+            'pies': (charts.pie_pair, {'left': series, 'right': series, 'titles': ('Damage', 'Hits'),
+                                       'cmap': 'Oranges_r', 'figsize': (12.5, 3.5)}),
+        })
+        self.assertEqual(list(images), ['bars', 'pies'])
+        for image in images.values():
+            self.assertTrue(image.startswith(b'\x89PNG'))
+
+    def test_pie_exploder(self):
+        self.assertEqual(charts.pie_exploder([500, 400, 10, 5, 1]).round(2).tolist(), [.01, .01, .01, .10, .19])
+        self.assertEqual(charts.pie_exploder(pd.Series([1, 1])).tolist(), [.01, .01])
+
+    def test_compress_level(self):
+        series = pd.Series([300, 120], index=['Inferno Heavy Missile', 'Federation Navy Hobgoblin'])
+        kwargs = {'left': series, 'right': series, 'titles': ('Mean', 'Top'), 'color': 'darkred', 'figsize': (11, 4)}
+        stored = charts.bar_pair(compress_level=0, **kwargs)
+        self.assertTrue(stored.startswith(b'\x89PNG'))
+        self.assertGreater(len(stored), len(charts.bar_pair(**kwargs)))
+
+
+class RenderServerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        """a server of a single renderer, started by its command in a process of its own as deployed"""
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'render.sock')
+        cls.server = subprocess.Popen(
+            [sys.executable, '-m', 'django', 'analyzer_render_server', '--socket', cls.path, '--processes', '1'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        )
+        deadline = time.monotonic() + 60
+        while not os.path.exists(cls.path) and cls.server.poll() is None and time.monotonic() < deadline:
+            time.sleep(.1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait(10)
+        assert not os.path.exists(cls.path), 'the socket left behind'
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        series = pd.Series([300, 120], index=['Inferno Heavy Missile', 'Federation Navy Hobgoblin'])
+        self.kwargs = {
+            'left': series, 'right': series, 'titles': ('Mean', 'Top'), 'color': 'darkred', 'figsize': (11, 4)
+        }
+
+    def test_charts_are_rendered_by_the_server(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        expected = charts.bar_pair(**self.kwargs)
+        self.assertEqual(request_render(self.path, charts.bar_pair, self.kwargs), expected)
+        with mock.patch('analyzer.render_server.RENDER_SOCKET', self.path):
+            self.assertEqual(render(charts.bar_pair, self.kwargs), expected)
+        with self.assertRaises(RenderError):
+            request_render(self.path, charts.bar_pair, dict(self.kwargs, color='no such color'))
+
+    @mock.patch('analyzer.render_server.RENDER_QUEUE_TIMEOUT', .5)
+    def test_charts_are_rendered_in_place_while_the_renderers_are_busy(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as busy:
+            busy.connect(self.path)
+            self.assertEqual(busy.recv(1), READY)  # the only renderer waiting on this client
+            with self.assertRaises(TimeoutError):
+                request_render(self.path, charts.bar_pair, self.kwargs)
+            with mock.patch('analyzer.render_server.RENDER_SOCKET', self.path), \
+                    self.assertLogs('analyzer.render_server', 'WARNING'):
+                self.assertEqual(render(charts.bar_pair, self.kwargs), charts.bar_pair(**self.kwargs))
+        with mock.patch('analyzer.render_server.RENDER_QUEUE_TIMEOUT', 10):  # the renderer free again
+            self.assertTrue(request_render(self.path, charts.bar_pair, self.kwargs).startswith(b'\x89PNG'))
+
+    def test_charts_are_rendered_in_place_without_the_server(self):
+        kwargs = {'left': self.kwargs['left'], 'right': self.kwargs['right'], 'titles': ('Damage', 'Hits'),
+                  'cmap': 'Reds_r', 'figsize': (12, 4)}
+        with mock.patch('analyzer.render_server.RENDER_SOCKET', os.path.join(self.directory, 'missing.sock')), \
+                self.assertLogs('analyzer.render_server', 'WARNING'):
+            self.assertEqual(render(charts.pie_pair, kwargs), charts.pie_pair(**kwargs))
+
+
+@mock.patch('analyzer.analyze.render_charts', return_value={'mean_delivered': b'png', 'top_delivered': b'top'})
+class PlotStorageTests(TempStorageMixin, TestCase):
+    def test_charts_are_saved_at_once(self, render):
+        Analyzer(SAMPLE_LOG, session_id='s')
+        self.assertEqual(bytes(Plot.objects.get(pk='s').mean_delivered), b'png')
+
+    @mock.patch('analyzer.analyze.PLOT_STORAGE', 'files')
+    def test_charts_are_saved_by_reference(self, render):
+        Analyzer(SAMPLE_LOG, session_id='s')
+        plot = Plot.objects.get(pk='s')
+        self.assertTrue(bytes(plot.top_delivered).startswith(b'file:'))
+        self.assertEqual(load_blob(plot.top_delivered), b'top')
+        self.assertEqual(load_blob(b'png'), b'png')
+
+
+class ChartStorageTests(TempStorageMixin, SimpleTestCase):
+    def test_charts_are_stored_per_analysis(self):
+        store_chart('a' * 64, 'mean_delivered', b'first')
+        store_chart('b' * 64, 'mean_delivered', b'second')
+        self.assertEqual(load_chart('a' * 64, 'mean_delivered'), b'first')
+        self.assertEqual(load_chart('b' * 64, 'mean_delivered'), b'second')
+        self.assertIsNone(load_chart('c' * 64, 'mean_delivered'))
+
+    def test_expired_charts_are_purged(self):
+        store_chart('d' * 64, 'mean_delivered', b'chart')
+        purge_expired(now=time.time() + CHART_TTL + 1)
+        self.assertIsNone(load_chart('d' * 64, 'mean_delivered'))
+
+    def test_charts_purged_meanwhile_are_skipped(self):
+        vanished = mock.Mock(path='vanished')
+        vanished.stat.side_effect = FileNotFoundError
+        listings = [mock.MagicMock(), FileNotFoundError(), mock.MagicMock()]
+        listings[0].__enter__.return_value = [mock.Mock(path='ab'), mock.Mock(path='cd')]
+        listings[2].__enter__.return_value = [vanished]
+        with mock.patch('analyzer.storage.os.scandir', side_effect=listings):
+            self.assertEqual(purge_expired(now=time.time() + CHART_TTL + 1), 0)
+
+    @mock.patch('analyzer.storage.close_old_connections')
+    @mock.patch('analyzer.storage.purge_expired_logs')
+    @mock.patch('analyzer.storage.purge_expired', side_effect=[OSError('disk gone'), 0])
+    @mock.patch('analyzer.storage.time.sleep', side_effect=[None, None, KeyboardInterrupt])
+    def test_collector_survives_failed_passes(self, sleep, purge, purge_logs, close_connections):
+        with self.assertLogs('analyzer.storage', 'ERROR'), self.assertRaises(KeyboardInterrupt):
+            collect()
+        self.assertEqual(purge.call_count, 2)
+        self.assertEqual(purge_logs.call_count, 1)
+        self.assertEqual(close_connections.call_count, 2)
+
+
+class BatchTests(SimpleTestCase):
+    def test_log_files_are_merged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.txt')
+            with open(path, 'wb') as f:
+                f.write(SAMPLE_FILE)
+            events, hits = parse_log_file(path)
+        self.assertEqual(events[HIT], [])
+        self.assertEqual(events[MISS], [])  # not kept, the batch not using them
+        self.assertEqual(events[BOUNTY], [('2022.11.01 08:29:30', 12345)])
+        merged = merge_hits([hits, hits.iloc[::-1]])
+        self.assertEqual(len(merged), 4)
+        self.assertEqual(merged.Entity.dtype, 'category')
+        self.assertTrue(merged.Time.is_monotonic_increasing)
+
+    def test_batch_charts_are_written_to_the_output_only(self):
+        """a SimpleTestCase, the database being off limits to the command"""
+        with tempfile.TemporaryDirectory() as directory:
+            for name, log in (('a.txt', SAMPLE_FILE), ('b.txt', SECOND_FIGHT)):
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(log)
+            output = os.path.join(directory, 'out')
+            call_command('analyze_logs', directory, workers=1, output=output, stdout=io.StringIO())
+            written = sorted(os.listdir(output))
+            with open(os.path.join(output, 'mean_delivered.png'), 'rb') as f:
+                self.assertTrue(f.read().startswith(b'\x89PNG'))
+        self.assertIn('context.json', written)
+        self.assertIn('delivered_timeline.png', written)
+
+
+class LiveAnalysisTests(TempStorageMixin, TestCase):
+    def test_chunks_are_folded_into_running_aggregates(self):
+        analysis = LiveAnalysis()
+        for i in range(0, len(SAMPLE_FILE), 100):  # splitting lines and multibyte characters alike
+            analysis.feed(SAMPLE_FILE[i:i + 100])
+        summary = analysis.feed(b'', final=True).summary()
+        self.assertEqual(summary['line_count'], 9)
+        self.assertEqual(summary['targets'], ['Tetrimon Oracle'])
+        self.assertEqual(summary['enemies'], ['Tetrimon Crucifier'])
+        self.assertEqual(summary['neuters'], {'Tetrimon Crucifier': 2})
+        self.assertEqual(summary['incoming_warp_prevention'], {'Warp disruption': 'Tetrimon Crucifier'})
+        self.assertEqual(summary['bounty'], 12345)
+        self.assertEqual(summary['delivered_per_weapon'],
+                         {'Inferno Heavy Missile': {'sum': 312, 'mean': 312.0, 'max': 312, 'count': 1}})
+        self.assertEqual(analysis.tokenizer.events[HIT], [])  # processed events aren't kept
+
+    def test_aggregates_are_merged(self):
+        analysis = LiveAnalysis()
+        line = (
+            '[ 2022.11.01 08:28:50 ] (combat) <b>{}</b> <font size=10>to</font> <b>Tetrimon Oracle</b>'
+            ' - Drone - Hits\r\n'
+        )
+        for damage in (10, 30):
+            analysis.feed(line.format(damage).encode())
+        self.assertEqual(analysis.summary()['delivered_per_target'],
+                         {'Tetrimon Oracle': {'sum': 40, 'mean': 20.0, 'max': 30, 'count': 2}})
+
+    def test_endpoint(self):
+        response = self.client.post(reverse('analyzer:live_start'))
+        self.assertEqual(response.status_code, 201)
+        url = response.json()['url']
+        self.client.post(url, SAMPLE_FILE[:200], content_type='application/octet-stream')
+        self.client.post(url + '?final=1', SAMPLE_FILE[200:], content_type='application/octet-stream')
+        self.assertEqual(self.client.get(url).json()['bounty'], 12345)
+        self.assertEqual(self.client.get(reverse('analyzer:live', args=['0' * 32])).status_code, 404)
+
+    def test_chunks_wait_for_the_previous_one(self):
+        url = self.client.post(reverse('analyzer:live_start')).json()['url']
+        live_id = url.rstrip('/').rsplit('/', 1)[1]
+        with live_lock(live_id), mock.patch('analyzer.live.LIVE_LOCK_TIMEOUT', 0):  # not waiting for it
+            response = self.client.post(url, SAMPLE_FILE, content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 503)
+        self.client.post(url + '?final=1', SAMPLE_FILE, content_type='application/octet-stream')
+        self.assertEqual(self.client.get(url).json()['line_count'], 9)
+
+    def test_live_analyses_need_a_shared_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['analyzer.W001'])
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_synthetic_logs_are_parsed_like_real_ones(self):
+        lines = list(generate_lines(500, enemies=3, player_weapons=2, enemy_weapons=1))
+        self.assertEqual(lines, list(generate_lines(500, enemies=3, player_weapons=2, enemy_weapons=1)))
+        self.assertEqual(len(lines), 500)
+        events = Tokenizer().feed(iter_escaped_lines(escaped_log(lines))).events
+        hits = hits_frame(events[HIT])
+        self.assertEqual(hits.Entity.nunique(), 3)
+        self.assertEqual(set(hits[hits.Direction == 'from'].Weapon), {'Synthetic Rocket 0', 'Unknown'})
+        self.assertTrue(events[NEUT] and events[WARP] and events[BOUNTY])
+        self.assertEqual(list(iter_decoded_lines([log_bytes(lines)]))[5], lines[5] + '\n')
+
+    def test_stages_are_timed(self):
+        results = run_benchmark([200], repeat=1)
+        run = results['runs'][0]
+        self.assertEqual(run['lines'], 200)
+        stages = PARSE_STAGES + SUMMARY_STAGES + PLOT_STAGES
+        self.assertEqual(list(run['stages'])[:len(stages)], list(stages))
+        analyzed = Analyzer(escaped_log(generate_lines(200)), lazy=True).stages  # every stage run by the analysis
+        self.assertEqual([name for name in analyzed if name not in ('parse_data', 'build_plots', 'run_analysis')],
+                         list(stages))
+        for chart in ('mean_delivered', 'delivered_timeline', 'received_timeline', 'neut_timeline'):
+            self.assertIn(f'render:{chart}', run['stages'])
+        self.assertGreater(run['stages']['get_lines']['peak_bytes'], 0)
+        self.assertIn(
+            (200, 'total', run['total_seconds'], run['total_seconds']), compare(results, results)
+        )
+
+
+class StageTests(TempStorageMixin, TestCase):
+    def test_stages_are_recorded_and_passed_to_the_hooks(self):
+        hook = mock.Mock()
+        with mock.patch('analyzer.stages.get_hooks', return_value=[hook]):
+            analyzer = Analyzer(SAMPLE_LOG, lazy=True)
+        hook.assert_called_once_with(analyzer, analyzer.stages)
+        self.assertEqual(list(analyzer.stages)[:2], ['get_lines', 'get_hits'])
+        self.assertIn('plot_mean_delivered', analyzer.stages)
+        self.assertEqual(list(analyzer.stages)[-1], 'run_analysis')
+        self.assertGreaterEqual(analyzer.stages['run_analysis']['wall'], analyzer.stages['parse_data']['wall'])
+        self.assertIsNone(analyzer.stages['get_lines']['alloc'])
+
+    @mock.patch('analyzer.stages.TRACE_MEMORY', True)
+    def test_allocations_are_traced_on_demand(self):
+        analyzer = Analyzer(SAMPLE_LOG, lazy=True)
+        self.assertIsInstance(analyzer.stages['get_hits']['alloc'], int)
+
+    def test_server_timing(self):
+        self.assertEqual(
+            server_timing({'get_lines': {'wall': .0123, 'cpu': .011, 'alloc': None}}),
+            'get_lines;dur=12.3;desc="cpu 11.0 ms"'
+        )
+
+    @mock.patch('analyzer.jobs.JOB_WORKERS', 0)
+    def test_output_reports_the_stages(self):
+        session = self.client.session
+        session['log'] = store_log([SAMPLE_FILE])
+        session.save()
+        run_job(submit(session['log']).pk)
+        header = self.client.get(reverse('analyzer:output'))['Server-Timing']
+        self.assertIn('get_lines;dur=', header)
+        self.assertIn('lookup;dur=', header)
+        response = self.client.get(reverse('analyzer:chart', args=[session['log'], 'mean_delivered']))
+        self.assertIn('chart;dur=', response['Server-Timing'])
+
+
+class MigrationTests(TestCase):
+    def test_models_match_the_migrations(self):
+        call_command('makemigrations', 'analyzer', check=True, dry_run=True, stdout=io.StringIO())
+
+
+class ImportTests(SimpleTestCase):
+    def test_urls_are_imported_without_the_analysis_stack(self):
+        script = (
+            'import sys, django; django.setup(); import analyzer.urls; '
+            'print(sorted({"pandas", "matplotlib", "seaborn", "pyarrow"} & set(sys.modules)))'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        ).stdout
+        self.assertEqual(output.strip(), '[]')
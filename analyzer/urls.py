@@ -8,5 +8,13 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('upload/', views.upload, name='upload'),
     path('output/', views.output, name='output'),
-    path('example/', views.example, name='example')
+    path('output/lines/', views.log_lines, name='log_lines'),
+    path('output/<slug:analysis_id>/engagement/<int:number>/', views.engagement, name='engagement'),
+    path('example/', views.example, name='example'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('live/', views.live_start, name='live_start'),
+    path('live/<slug:live_id>/', views.live, name='live'),
+    path('api/<slug:analysis_id>/summary.json', views.export_summary, name='export_summary'),
+    path('api/<slug:analysis_id>/hits.<slug:fmt>', views.export_hits, name='export_hits'),
+    path('chart/<slug:analysis_id>/<slug:name>.png', views.chart, name='chart'),
 ]
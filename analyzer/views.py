@@ -1,12 +1,29 @@
-from django.http import HttpResponseRedirect # HttpResponse
+import codecs
+
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404
 # from django.utils.html import escape
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag, require_POST, require_http_methods
 from .forms import UploadFileForm
-import os
 
-from .analyze import Analyzer
+from .export import HITS_FORMATS, summary_json, encode_hits
+from .jobs import submit, recover, load_result, find_analysis, find_engagement, get_or_render_chart
+from .logs import store_log, touch_log, read_window
+from .models import AnalysisJob
+from .stages import record, server_timing
+from .storage import CHART_TTL
 from .local_vars import image_dir_prefix
 
+LOG_WINDOW = 500  # lines of the log sent at most per request of the viewer
+
+_example_id = None  # hash of the bundled example log once stored by this process
+
+# modules importing pandas or matplotlib (analyze, charts, series, live) are only imported by the views using them,
+# sparing the processes serving other traffic; see warmup.py for paying that cost up front instead
+
 
 def index(request):
     context = {'form': UploadFileForm(), 'not_gamelog': request.session.get('not_gamelog', False)}
@@ -18,9 +35,10 @@ def upload(request):
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
-            data = str(request.FILES['file'].read())
-            if 'Gamelog' in data:
-                request.session['data'] = data[2:-1]
+            log_id = store_log(request.FILES['file'].chunks())
+            if log_id:
+                request.session['log'] = log_id
+                submit(log_id, retry=True)  # the analysis of a log that failed before being tried again
                 return HttpResponseRedirect('/analyzer/output')
             else:
                 request.session['not_gamelog'] = True
@@ -31,19 +49,167 @@ def upload(request):
 
 
 def output(request):
-    if 'data' not in request.session.keys():
+    if 'log' not in request.session.keys():
         return HttpResponseRedirect('/analyzer')
-    with os.scandir(image_dir_prefix + 'main/static/main/images') as it:
-        for entry in it:
-            if 'chart' in entry.name:
-                os.remove(entry)
-    analyzer = Analyzer(request.session['data'])
-    context = analyzer.context
+    key = request.session['log']
+    if not touch_log(key):  # the log has expired
+        return HttpResponseRedirect('/analyzer')
+    timings = {}
+    with record(timings, 'lookup'):
+        analysis = find_analysis(key)
+    if analysis is None:  # the same log hasn't been analyzed before
+        job = submit(key)
+        if not job.is_finished():
+            return render(request, 'analyzer/pending.html', {'job': job, 'form': UploadFileForm()})
+        analysis = load_result(job)
+    if analysis is None:  # the job has failed
+        context = {'processed': False}
+    else:
+        context = dict(analysis['context'], analysis_id=key)
+        from .series import CHART_MODE, chart_series
+        if request.GET.get('charts', CHART_MODE) == 'client':  # no plotting on the server at all
+            context['client_charts'] = True
+            context['chart_series'] = chart_series(analysis['specs'])
     context['form'] = UploadFileForm()
-    return render(request, 'analyzer/output.html', context)
+    with record(timings, 'template'):
+        response = render(request, 'analyzer/output.html', context)
+    if analysis is not None:  # the stages of the analysis, whenever it ran, next to the time of this request
+        timings = dict(analysis.get('stages') or {}, **timings)
+    response['Server-Timing'] = server_timing(timings)
+    return response
+
+
+def engagement(request, analysis_id, number):
+    """the summary and charts of a single engagement of an analysis, its charts rendered on request"""
+    engagement = find_engagement(analysis_id, number)
+    if engagement is None or not engagement['context']['engagements']:
+        raise Http404('No such engagement')
+    context = dict(
+        engagement['context'], analysis_id=analysis_id, engagement=engagement['context']['engagements'][0],
+        chart_prefix=f'engagement-{number}-', form=UploadFileForm()
+    )
+    from .series import CHART_MODE, chart_series
+    if request.GET.get('charts', CHART_MODE) == 'client':
+        context['client_charts'] = True
+        context['chart_series'] = {
+            context['chart_prefix'] + name: series for name, series in chart_series(engagement['specs']).items()
+        }
+    return render(request, 'analyzer/engagement.html', context)
+
+
+def log_lines(request):
+    """a window of the lines of the log of the session, ?from= the first line and count= lines at most,
+    counting only the lines of the ?channel= if given"""
+    key = request.session.get('log')
+    if key is None or not touch_log(key):
+        raise Http404('No log')
+    try:
+        start = max(int(request.GET.get('from', 0)), 0)
+        count = min(max(int(request.GET.get('count', LOG_WINDOW)), 0), LOG_WINDOW)
+    except ValueError:
+        return JsonResponse({'error': 'from and count should be numbers'}, status=400)
+    window = read_window(key, start, count, request.GET.get('channel'))
+    following = start + len(window['lines'])
+    return JsonResponse({
+        'from': start,
+        'total': window['total'],
+        'next': following if following < window['total'] else None,
+        'channels': window['channels'],
+        'lines': window['lines'],
+    })
+
+
+def job_status(request, job_id):
+    job = recover(get_object_or_404(AnalysisJob, pk=job_id))
+    return JsonResponse({
+        'id': str(job.id),
+        'status': job.status,
+        'finished': job.is_finished(),
+        'output': reverse('analyzer:output'),
+    })
+
+
+def chart_etag(request, analysis_id, name):
+    return f'{analysis_id}-{name}'  # analysis id being the log hash, the same chart URL always means the same image
+
+
+@etag(chart_etag)
+@cache_control(private=True, max_age=CHART_TTL)
+def chart(request, analysis_id, name):
+    timings = {}
+    with record(timings, 'chart'):  # rendering and encoding the chart on the first request
+        image = get_or_render_chart(analysis_id, name)
+    if image is None:
+        raise Http404('No such chart')
+    response = HttpResponse(image, content_type='image/png')
+    response['Server-Timing'] = server_timing(timings)
+    return response
+
+
+@csrf_exempt  # fed by the tail_gamelog.py script rather than by a form
+@require_POST
+def live_start(request):
+    from .live import start_live
+    live_id = start_live()
+    return JsonResponse({'id': live_id, 'url': reverse('analyzer:live', args=[live_id])}, status=201)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def live(request, live_id):
+    """GET returns the summary of the log so far, POST feeds it the bytes appended to the log since the last POST"""
+    from .live import load_live, feed_live, LiveBusy
+    if request.method == 'POST':
+        try:
+            analysis = feed_live(live_id, request.body, final=request.GET.get('final') == '1')
+        except LiveBusy:
+            return JsonResponse({'error': 'the previous chunk is still being analyzed'}, status=503)
+    else:
+        analysis = load_live(live_id)
+    if analysis is None:
+        raise Http404('No such live analysis')
+    return JsonResponse(analysis.summary())
+
+
+def export_etag(request, analysis_id, fmt='json'):
+    return f'{analysis_id}-{fmt}'
+
+
+@etag(export_etag)
+@cache_control(private=True, max_age=CHART_TTL)
+def export_summary(request, analysis_id):
+    analysis = find_analysis(analysis_id)
+    if analysis is None:
+        raise Http404('No such analysis')
+    return HttpResponse(summary_json(analysis['context']), content_type='application/json')
+
+
+@etag(export_etag)
+@cache_control(private=True, max_age=CHART_TTL)
+def export_hits(request, analysis_id, fmt):
+    """hit rows of the analysis in a columnar format, for tools to load without rerunning the parser"""
+    analysis = find_analysis(analysis_id)
+    if fmt not in HITS_FORMATS or analysis is None or analysis.get('hits') is None:
+        raise Http404('No such export')
+    try:
+        data = encode_hits(analysis['hits'], fmt)
+    except ImportError as e:
+        return HttpResponse(str(e), status=501)
+    response = HttpResponse(data, content_type=HITS_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{analysis_id[:12]}-hits.{fmt}"'
+    return response
+
+
+def example_log():
+    """:return: id of the stored example log, decoded and stored again only when it has expired"""
+    global _example_id
+    if _example_id is None or not touch_log(_example_id):
+        with open(image_dir_prefix + 'analyzer/resources/example-log.txt', 'rb') as f:
+            # the example is kept in the escaped form of the former uploads, turned back into the log bytes here
+            _example_id = store_log([codecs.escape_decode(f.read())[0]])
+    return _example_id
 
 
 def example(request):
-    with open(image_dir_prefix + 'analyzer/resources/example-log.txt', 'r') as f:
-        request.session['data'] = f.read()
-        return HttpResponseRedirect('/analyzer/output')
+    request.session['log'] = example_log()
+    return HttpResponseRedirect('/analyzer/output')
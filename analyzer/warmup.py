@@ -0,0 +1,14 @@
+"""
+Paying the start-up cost of the analysis stack up front: with ANALYZER_PRELOAD = True the app imports pandas,
+matplotlib and seaborn and loads the fonts once at django setup, which a preforking server such as
+`gunicorn --preload mysite.wsgi` does in its master process, so that its workers share the result copy-on-write.
+Left off, each process pays that cost on its first analysis only.
+"""
+
+
+def warm_up():
+    import pandas as pd
+
+    from . import analyze, charts, live, series  # noqa: F401
+    # drawing text once fills matplotlib's font caches
+    charts.bar_pair(pd.Series([1]), pd.Series([1]), titles=('', ''), color='gray', figsize=(1, 1))
@@ -0,0 +1,12 @@
+# Entry points of the analysis process pool, kept free of module level django imports
+# so that a freshly spawned worker can import them before django is set up.
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def run(job_id):
+    from .jobs import run_job
+    run_job(job_id)